@@ -0,0 +1,201 @@
+"""
+Album membership captured from Takeout folder structure.
+
+Takeout lays media out as `Takeout/Google Photos/<folder>/<file>`, under
+`unzipped/<zip-stem>/` or directly under `unzipped/` depending on how the ZIP
+was expanded.
+A folder is an album when it carries an album `metadata.json`; the
+auto-generated `Photos from YYYY` folders are not albums. Takeout may ship that
+`metadata.json` in a different ZIP from the album's media, so in the per-stem
+layout the same folder is looked up in every sibling stem, and a member whose
+album metadata is in no staged ZIP yet is titled by its folder name. The planner tags each
+occurrence with its album while it enumerates, so membership costs no extra
+walk or hash:
+
+- per run:  `MANIFESTS/<RUN_LABEL>/album_membership.csv` (every occurrence in an album)
+- global:   `MANIFESTS/album_index/` (album <-> sha, merged across runs)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from lib.manifests import iter_manifest, resolve_manifest, write_manifest
+
+ALBUM_MEMBERSHIP_CSV_NAME = "album_membership.csv"
+ALBUM_MEMBERSHIP_FIELDS = ["albumTitle", "sha256", "ext", "account", "albumFolder", "relativePath"]
+
+# Global index: one row per (album, sha, account); runs.txt lists the run manifests folded in
+ALBUM_INDEX_FIELDS = ["albumTitle", "sha256", "account", "fileName", "firstRun"]
+
+YEAR_FOLDER_RX = re.compile(r"^Photos from \d{4}$")
+ALBUM_METADATA_NAME = "metadata.json"
+
+
+@lru_cache(maxsize=None)
+def _album_title(album_dir: str) -> Optional[str]:
+    """Album title from `<album_dir>/metadata.json`, or None if the folder is not an album."""
+    meta = os.path.join(album_dir, ALBUM_METADATA_NAME)
+    if not os.path.isfile(meta):
+        return None
+    try:
+        with open(meta, "r", encoding="utf-8") as f:
+            js = json.load(f)
+    except Exception:
+        js = {}
+    title = js.get("title") if isinstance(js, dict) else None
+    if isinstance(title, str) and title.strip():
+        return title.strip()
+    return os.path.basename(album_dir)
+
+
+@lru_cache(maxsize=None)
+def _album_title_any_stem(takeout_root: str, album_rel: str) -> Optional[str]:
+    """_album_title() of `<stem>/<album_rel>` for the first stem under `takeout_root` that has one."""
+    try:
+        stems = sorted(os.listdir(takeout_root))
+    except OSError:
+        return None
+    for stem in stems:
+        title = _album_title(os.path.join(takeout_root, stem, album_rel))
+        if title is not None:
+            return title
+    return None
+
+
+def album_of(takeout_root: str, relative_path: str) -> tuple[str, str]:
+    """(albumFolder, albumTitle) for an occurrence, or ("", "") when it is not in an album."""
+    parts = relative_path.replace("\\", "/").split("/")
+    # [<zip-stem>/]Takeout/<product>/<album>/<file>: the file must sit directly in the album folder
+    if "Takeout" not in parts or len(parts) - parts.index("Takeout") != 4:
+        return "", ""
+    folder = parts[-2]
+    if YEAR_FOLDER_RX.match(folder):
+        return "", ""
+    album_folder = "/".join(parts[:-1])
+    title = _album_title(os.path.join(takeout_root, album_folder))
+    if title is None and parts.index("Takeout") == 1:
+        # <zip-stem>/Takeout/...: the album's metadata.json may have come in another ZIP
+        title = _album_title_any_stem(takeout_root, "/".join(parts[1:-1])) or folder
+    if title is None:
+        return "", ""
+    return album_folder, title
+
+
+def membership_rows(*occurrence_maps: dict[str, list[dict]]) -> list[dict]:
+    """Album membership rows for every occurrence (new and already-in-canon) that sits in an album."""
+    rows: list[dict] = []
+    for by_sha in occurrence_maps:
+        for sha, recs in by_sha.items():
+            for r in recs:
+                if not r.get("albumTitle"):
+                    continue
+                rows.append(
+                    {
+                        "albumTitle": r["albumTitle"],
+                        "sha256": sha,
+                        "ext": r["ext"],
+                        "account": r["account"],
+                        "albumFolder": r["albumFolder"],
+                        "relativePath": r["relativePath"],
+                    }
+                )
+    rows.sort(key=lambda r: (r["albumTitle"], r["sha256"], r["account"], r["relativePath"]))
+    return rows
+
+
+def write_album_membership(out_dir: str, rows: Iterable[dict], fmt: Optional[str] = None) -> str:
+    return write_manifest(os.path.join(out_dir, ALBUM_MEMBERSHIP_CSV_NAME), ALBUM_MEMBERSHIP_FIELDS, rows, fmt=fmt)
+
+
+def album_dir_name(title: str) -> str:
+    """Filesystem-safe folder name for an album title."""
+    name = re.sub(r'[\x00-\x1f/\\:*?"<>|]+', "_", title).strip().strip(".")
+    return name[:120] or "_"
+
+
+class AlbumIndex:
+    """
+    Album <-> sha membership merged across runs, under `root`:
+
+        albums.csv      rows sorted by album title, then sha (album -> shas)
+        sha_albums.csv  the same rows sorted by sha, then album (sha -> albums)
+        runs.txt        runs whose album_membership manifest has been folded in
+
+    Run manifests are immutable, so each run is read once; `add_run()` returns
+    only the (album, sha) pairs it introduced, for incremental view updates.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.albums_path = os.path.join(root, "albums.csv")
+        self.by_sha_path = os.path.join(root, "sha_albums.csv")
+        self.runs_path = os.path.join(root, "runs.txt")
+
+        self.rows: dict[tuple[str, str, str], dict] = {}
+        self.runs: set[str] = set()
+        self._pairs: set[tuple[str, str]] = set()
+        path = resolve_manifest(self.albums_path)
+        if path is not None:
+            for row in iter_manifest(path, required=ALBUM_INDEX_FIELDS):
+                self.rows[(row.albumTitle, row.sha256, row.account)] = row._asdict()
+                self._pairs.add((row.albumTitle, row.sha256))
+        if os.path.isfile(self.runs_path):
+            with open(self.runs_path, "r", encoding="utf-8") as f:
+                self.runs = {ln.strip() for ln in f if ln.strip()}
+
+    def add_run(self, run_label: str, membership: Iterable) -> list[dict]:
+        """Fold one run's membership rows (namedtuples or dicts) in; returns one row per new (album, sha) pair."""
+        added: list[dict] = []
+        for m in membership:
+            m = m if isinstance(m, dict) else m._asdict()
+            key = (m["albumTitle"], m["sha256"], m["account"])
+            if key in self.rows:
+                continue
+            row = {
+                "albumTitle": m["albumTitle"],
+                "sha256": m["sha256"],
+                "account": m["account"],
+                "fileName": os.path.basename(m["relativePath"]),
+                "firstRun": run_label,
+            }
+            self.rows[key] = row
+            if (key[0], key[1]) not in self._pairs:
+                self._pairs.add((key[0], key[1]))
+                added.append(row)
+        self.runs.add(run_label)
+        return added
+
+    def clear(self) -> None:
+        self.rows.clear()
+        self.runs.clear()
+        self._pairs.clear()
+
+    def pair_rows(self) -> list[dict]:
+        """One row per (album, sha) pair (the first account in sort order)."""
+        out: dict[tuple[str, str], dict] = {}
+        for key in sorted(self.rows):
+            out.setdefault((key[0], key[1]), self.rows[key])
+        return list(out.values())
+
+    def write(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        rows = sorted(self.rows.values(), key=lambda r: (r["albumTitle"], r["sha256"], r["account"]))
+        write_manifest(self.albums_path, ALBUM_INDEX_FIELDS, rows)
+        rows.sort(key=lambda r: (r["sha256"], r["albumTitle"], r["account"]))
+        write_manifest(self.by_sha_path, ALBUM_INDEX_FIELDS, rows)
+        tmp = self.runs_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(f"{r}\n" for r in sorted(self.runs)))
+        os.replace(tmp, self.runs_path)
+
+    def albums(self) -> dict[str, int]:
+        """Album title -> number of distinct shas."""
+        counts: dict[str, int] = {}
+        for title, _ in self._pairs:
+            counts[title] = counts.get(title, 0) + 1
+        return counts
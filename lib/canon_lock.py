@@ -0,0 +1,44 @@
+"""Advisory lock serialising writers to CANON (materialization, sidecars, views)."""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def canon_lock_path(photo_archive: str) -> str:
+    return os.path.join(photo_archive, "LOCKS", "canon.lock")
+
+
+@contextmanager
+def canon_lock(photo_archive: str, timeout: float | None = None) -> Iterator[str]:
+    """
+    Hold an exclusive flock on PHOTO_ARCHIVE/LOCKS/canon.lock for the duration of the block.
+
+    Blocks until the lock is free, or raises SystemExit after `timeout` seconds.
+    The lock is released automatically if the process dies.
+    """
+    path = canon_lock_path(photo_archive)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise SystemExit(f"ERROR: timed out waiting for CANON lock: {path}")
+                time.sleep(1.0)
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        try:
+            yield path
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -0,0 +1,350 @@
+"""
+Read-only HTTP access to CANON, for local consumers (e.g. a Shafferography import).
+
+Routes (GET and HEAD unless noted):
+
+    /                      counts, as JSON
+    /media/<sha>           canonical bytes; Range, ETag "<sha>", Cache-Control immutable
+    /sidecar/<sha>         sidecar JSON (per-file sidecar, else the packed store)
+    /meta?sha=<a>,<b>      batch lookup: ext, size, content type, sidecar presence
+    POST /meta             same, body {"shas": [...], "sidecars": false}
+
+Canonical bytes never change for a sha, so media responses are cacheable
+forever. Sidecars can be regenerated, so they are revalidated instead.
+The sha -> file index is built once at startup (`CanonIndex.load()`, again on
+SIGHUP); media bodies go out with `loop.sendfile()` (zero-copy where the OS
+supports it).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import mimetypes
+import os
+import re
+import zlib
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from lib.fs_filters import should_skip_filename
+from lib.run_plan import RX_CANON
+from lib.sidecar_store import SidecarStore
+
+RX_SHA = re.compile(r"^[0-9a-f]{64}$")
+RX_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+SIDECAR_SUFFIX = ".shafferography.json"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_SHAS = 5000
+
+REASONS = {
+    200: "OK", 206: "Partial Content", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large", 501: "Not Implemented",
+}
+
+# Types mimetypes does not know everywhere
+EXTRA_TYPES = {".heic": "image/heic", ".m4v": "video/x-m4v", ".3gp": "video/3gpp", ".webm": "video/webm"}
+
+
+def content_type(ext: str) -> str:
+    return EXTRA_TYPES.get(ext) or mimetypes.types_map.get(ext) or "application/octet-stream"
+
+
+class CanonIndex:
+    """In-memory sha -> canonical file (and sidecar) index."""
+
+    def __init__(self, canon: str, pack_root: Optional[str] = None):
+        self.canon = canon
+        self.pack_root = pack_root
+        self.media: dict[str, tuple[str, int]] = {}
+        self.sidecar_files: dict[str, str] = {}
+        self.packed: Optional[SidecarStore] = None
+
+    def load(self) -> None:
+        media: dict[str, tuple[str, int]] = {}
+        sidecars: dict[str, str] = {}
+        with os.scandir(self.canon) as it:
+            for entry in it:
+                name = entry.name
+                if should_skip_filename(name):
+                    continue
+                if name.endswith(SIDECAR_SUFFIX):
+                    m = RX_CANON.match(name[: -len(SIDECAR_SUFFIX)])
+                    if m:
+                        sidecars[m.group("sha").lower()] = name
+                    continue
+                m = RX_CANON.match(name)
+                if m and entry.is_file():
+                    media[m.group("sha").lower()] = (name, entry.stat().st_size)
+        self.media = media
+        self.sidecar_files = sidecars
+        self.packed = SidecarStore(self.pack_root) if self.pack_root else None
+
+    def media_path(self, sha: str) -> Optional[tuple[str, str, int]]:
+        """(path, ext, size) for a sha, or None."""
+        hit = self.media.get(sha)
+        if hit is None:
+            return None
+        name, size = hit
+        return os.path.join(self.canon, name), os.path.splitext(name)[1].lower(), size
+
+    def has_sidecar(self, sha: str) -> bool:
+        return sha in self.sidecar_files or (self.packed is not None and sha in self.packed)
+
+    def sidecar_bytes(self, sha: str) -> Optional[bytes]:
+        name = self.sidecar_files.get(sha)
+        if name is not None:
+            try:
+                with open(os.path.join(self.canon, name), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+        if self.packed is not None:
+            sidecar = self.packed.get(sha)
+            if sidecar is not None:
+                return (json.dumps(sidecar, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+        return None
+
+    def meta(self, sha: str, with_sidecar: bool = False) -> Optional[dict]:
+        hit = self.media_path(sha)
+        if hit is None:
+            return None
+        _, ext, size = hit
+        out: dict = {
+            "ext": ext,
+            "size": size,
+            "contentType": content_type(ext),
+            "media": f"/media/{sha}",
+            "hasSidecar": self.has_sidecar(sha),
+        }
+        if with_sidecar and out["hasSidecar"]:
+            raw = self.sidecar_bytes(sha)
+            out["sidecar"] = json.loads(raw) if raw is not None else None
+        return out
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    (start, end inclusive) for a single-range `Range` header.
+
+    Returns None when the header should be ignored (multi-range or malformed,
+    which per RFC 9110 means serving the whole file) and raises ValueError
+    when the range cannot be satisfied.
+    """
+    m = RX_RANGE.match(header.strip())
+    if not m:
+        return None
+    first, last = m.group(1), m.group(2)
+    if not first and not last:
+        return None
+    if not first:
+        n = int(last)
+        if n == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError("range outside file")
+    return start, end
+
+
+class CanonServer:
+    def __init__(self, index: CanonIndex):
+        self.index = index
+        self.requests = 0
+        self.bytes_sent = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 431, b"", close=True)
+                    return
+                keep_alive = await self._dispatch(head, reader, writer)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            return
+        finally:
+            writer.close()
+
+    async def _dispatch(self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await self._send(writer, 400, b"", close=True)
+            return False
+        headers: dict[str, str] = {}
+        for ln in lines[1:]:
+            if ":" in ln:
+                k, v = ln.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+
+        conn = headers.get("connection", "").lower()
+        keep_alive = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+        head_only = method == "HEAD"
+        self.requests += 1
+
+        body = b""
+        if "transfer-encoding" in headers:
+            await self._send(writer, 501, b"", close=True, head_only=head_only)
+            return False
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            # The body cannot be delimited, so the connection cannot be reused either
+            await self._send(writer, 400, b"", close=True, head_only=head_only)
+            return False
+        if length > MAX_BODY_BYTES:
+            await self._send(writer, 413, b"", close=True, head_only=head_only)
+            return False
+        if length:
+            body = await reader.readexactly(length)
+
+        url = urlsplit(target)
+        path = url.path
+
+        if path == "/" and method in ("GET", "HEAD"):
+            stats = {
+                "canonicals": len(self.index.media),
+                "sidecarFiles": len(self.index.sidecar_files),
+                "packedSidecars": len(self.index.packed) if self.index.packed is not None else 0,
+            }
+            await self._send_json(writer, 200, stats, head_only, keep_alive)
+        elif path.startswith("/media/") and method in ("GET", "HEAD"):
+            await self._media(writer, path[len("/media/"):].lower(), headers, head_only, keep_alive)
+        elif path.startswith("/sidecar/") and method in ("GET", "HEAD"):
+            await self._sidecar(writer, path[len("/sidecar/"):].lower(), headers, head_only, keep_alive)
+        elif path == "/meta" and method in ("GET", "HEAD", "POST"):
+            await self._meta(writer, method, url.query, body, head_only, keep_alive)
+        elif path in ("/", "/meta") or path.startswith(("/media/", "/sidecar/")):
+            allow = "GET, HEAD, POST" if path == "/meta" else "GET, HEAD"
+            await self._send(writer, 405, b"", close=not keep_alive, extra={"Allow": allow}, head_only=head_only)
+        else:
+            await self._send(writer, 404, b"", close=not keep_alive, head_only=head_only)
+        return keep_alive
+
+    async def _media(self, writer, sha: str, headers: dict, head_only: bool, keep_alive: bool) -> None:
+        hit = self.index.media_path(sha) if RX_SHA.match(sha) else None
+        if hit is None:
+            await self._send(writer, 404, b"", close=not keep_alive, head_only=head_only)
+            return
+        path, ext, size = hit
+        etag = f'"{sha}"'
+        common = {"ETag": etag, "Cache-Control": IMMUTABLE, "Accept-Ranges": "bytes"}
+
+        if etag in [t.strip() for t in headers.get("if-none-match", "").split(",")] or headers.get("if-none-match") == "*":
+            await self._send(writer, 304, b"", close=not keep_alive, extra=common)
+            return
+
+        status, start, end = 200, 0, size - 1
+        rng = headers.get("range")
+        if rng and headers.get("if-range", etag) == etag:
+            try:
+                parsed = parse_range(rng, size)
+            except ValueError:
+                await self._send(
+                    writer, 416, b"", close=not keep_alive, extra=dict(common, **{"Content-Range": f"bytes */{size}"}),
+                    head_only=head_only,
+                )
+                return
+            if parsed is not None:
+                status, (start, end) = 206, parsed
+                common["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        count = end - start + 1 if size else 0
+        self._write_head(writer, status, count, content_type(ext), not keep_alive, common)
+        if head_only or count == 0:
+            await writer.drain()
+            return
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            # Removed since startup; the head is already out, so just drop the connection
+            writer.transport.abort()
+            return
+        with f:
+            await writer.drain()
+            await asyncio.get_running_loop().sendfile(writer.transport, f, start, count)
+        self.bytes_sent += count
+
+    async def _sidecar(self, writer, sha: str, headers: dict, head_only: bool, keep_alive: bool) -> None:
+        raw = self.index.sidecar_bytes(sha) if RX_SHA.match(sha) else None
+        if raw is None:
+            await self._send(writer, 404, b"", close=not keep_alive, head_only=head_only)
+            return
+        # Sidecars can be regenerated, so clients revalidate; the tag changes with the content
+        etag = f'"{sha}-{len(raw):x}-{zlib.crc32(raw):08x}"'
+        extra = {"ETag": etag, "Cache-Control": "no-cache"}
+        if headers.get("if-none-match") == etag:
+            await self._send(writer, 304, b"", close=not keep_alive, extra=extra)
+            return
+        await self._send(writer, 200, raw, close=not keep_alive, extra=extra,
+                         ctype="application/json; charset=utf-8", head_only=head_only)
+
+    async def _meta(self, writer, method: str, query: str, body: bytes, head_only: bool, keep_alive: bool) -> None:
+        with_sidecar = False
+        if method == "POST":
+            try:
+                req = json.loads(body or b"{}")
+                shas = req["shas"]
+                with_sidecar = bool(req.get("sidecars", False))
+                if not isinstance(shas, list):
+                    raise ValueError
+            except (ValueError, KeyError, TypeError):
+                await self._send_json(writer, 400, {"error": 'expected {"shas": [...]}'}, False, keep_alive)
+                return
+        else:
+            qs = parse_qs(query)
+            shas = [s for v in qs.get("sha", []) for s in v.split(",") if s]
+            with_sidecar = qs.get("sidecars", ["0"])[0] == "1"
+        if len(shas) > MAX_BATCH_SHAS:
+            await self._send_json(writer, 413, {"error": f"at most {MAX_BATCH_SHAS} shas per request"}, head_only, keep_alive)
+            return
+
+        out: dict[str, Optional[dict]] = {}
+        for s in shas:
+            sha = str(s).strip().lower()
+            out[sha] = self.index.meta(sha, with_sidecar) if RX_SHA.match(sha) else None
+        await self._send_json(writer, 200, out, head_only, keep_alive)
+
+    # ---- response helpers ------------------------------------------------------
+
+    def _write_head(self, writer, status: int, length: int, ctype: str, close: bool, extra: Optional[dict] = None) -> None:
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Length: {length}"]
+        if status != 304:
+            lines.append(f"Content-Type: {ctype}")
+        for k, v in (extra or {}).items():
+            lines.append(f"{k}: {v}")
+        lines.append("Connection: close" if close else "Connection: keep-alive")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send(self, writer, status: int, body: bytes, close: bool, extra: Optional[dict] = None,
+                    ctype: str = "text/plain; charset=utf-8", head_only: bool = False) -> None:
+        if not body and status >= 400:
+            body = f"{status} {REASONS.get(status, '')}\n".encode("utf-8")
+        if status == 304:
+            body = b""
+        self._write_head(writer, status, len(body), ctype, close, extra)
+        if not head_only:
+            writer.write(body)
+            self.bytes_sent += len(body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, obj, head_only: bool, keep_alive: bool) -> None:
+        body = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+        await self._send(writer, status, body, close=not keep_alive,
+                         ctype="application/json; charset=utf-8", head_only=head_only)
@@ -0,0 +1,333 @@
+"""
+Capture date straight from file headers, without exiftool.
+
+Reads only the bytes that hold the date, via bounded seek + read:
+
+- JPEG:       APP1 `Exif` segment -> TIFF IFD0 -> Exif IFD
+- TIFF/raw:   IFD0 -> Exif IFD (DNG, CR2, NEF, ... are TIFF-based)
+- HEIF/AVIF:  `meta` box -> `iinf` (the `Exif` item) + `iloc` (where it lives) -> TIFF
+- MOV/MP4:    `moov/mvhd` creation time (1904 epoch), else `moov/udta` `©day`
+
+Tag preference mirrors `exiftool -DateTimeOriginal -CreateDate`:
+DateTimeOriginal (0x9003), then CreateDate (0x9004); for movies the `mvhd` time
+(exiftool's QuickTime CreateDate, not timezone-converted). Dates are returned in
+EXIF form, `YYYY:MM:DD HH:MM:SS`. Zeroed placeholder dates count as missing.
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import struct
+from datetime import datetime, timedelta
+from typing import BinaryIO, Iterator, Optional
+
+EXIF_DATE_RX = re.compile(r"^(\d{4}):(\d{2}):(\d{2})(?:[ T](\d{2}):(\d{2}):(\d{2}))?")
+ISO_DATE_RX = re.compile(r"^(\d{4})-(\d{2})-(\d{2})(?:T(\d{2}):(\d{2}):(\d{2}))?")
+
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_CREATE_DATE = 0x9004
+
+MOV_EPOCH = datetime(1904, 1, 1)
+
+BMFF_TOP_LEVEL = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+
+# Bounds for malformed files
+MAX_IFD_ENTRIES = 1024
+MAX_BOXES = 4096
+MAX_JPEG_SEGMENTS = 64
+MAX_META_BYTES = 4 * 1024 * 1024
+MAX_EXIF_ITEM_BYTES = 1024 * 1024
+
+
+def _read_at(f: BinaryIO, offset: int, n: int) -> bytes:
+    f.seek(offset)
+    return f.read(n)
+
+
+def _valid(stamp: str) -> Optional[str]:
+    m = EXIF_DATE_RX.match(stamp.strip())
+    if not m or m.group(1) == "0000" or not ("01" <= m.group(2) <= "12") or not ("01" <= m.group(3) <= "31"):
+        return None
+    h, mi, s = m.group(4) or "00", m.group(5) or "00", m.group(6) or "00"
+    return f"{m.group(1)}:{m.group(2)}:{m.group(3)} {h}:{mi}:{s}"
+
+
+# ---- TIFF / EXIF -------------------------------------------------------------
+
+
+def _ifd_entries(f: BinaryIO, base: int, offset: int, e: str) -> Iterator[tuple[int, int, int, bytes]]:
+    """(tag, type, count, 4-byte value/offset field) for each entry of the IFD at `offset`."""
+    raw = _read_at(f, base + offset, 2)
+    if len(raw) < 2:
+        return
+    n = min(struct.unpack(e + "H", raw)[0], MAX_IFD_ENTRIES)
+    table = _read_at(f, base + offset + 2, n * 12)
+    for i in range(len(table) // 12):
+        tag, typ, count = struct.unpack(e + "HHI", table[i * 12:i * 12 + 8])
+        yield tag, typ, count, table[i * 12 + 8:i * 12 + 12]
+
+
+def _tiff_date(f: BinaryIO, base: int) -> Optional[str]:
+    """DateTimeOriginal, else CreateDate, from the TIFF structure starting at `base`."""
+    hdr = _read_at(f, base, 8)
+    if hdr[:4] == b"II*\x00":
+        e = "<"
+    elif hdr[:4] == b"MM\x00*":
+        e = ">"
+    else:
+        return None
+
+    exif_ifd = None
+    for tag, _, _, value in _ifd_entries(f, base, struct.unpack(e + "I", hdr[4:8])[0], e):
+        if tag == TAG_EXIF_IFD:
+            exif_ifd = struct.unpack(e + "I", value)[0]
+            break
+    if exif_ifd is None:
+        return None
+
+    found: dict[int, str] = {}
+    for tag, typ, count, value in _ifd_entries(f, base, exif_ifd, e):
+        if tag not in (TAG_DATETIME_ORIGINAL, TAG_CREATE_DATE) or typ != 2:
+            continue
+        if count > 4:
+            value = _read_at(f, base + struct.unpack(e + "I", value)[0], min(count, 64))
+        found[tag] = value.split(b"\x00", 1)[0].decode("ascii", "replace")
+
+    for tag in (TAG_DATETIME_ORIGINAL, TAG_CREATE_DATE):
+        stamp = _valid(found.get(tag, ""))
+        if stamp:
+            return stamp
+    return None
+
+
+def _jpeg_date(f: BinaryIO) -> Optional[str]:
+    pos = 2
+    for _ in range(MAX_JPEG_SEGMENTS):
+        hdr = _read_at(f, pos, 4)
+        if len(hdr) < 4 or hdr[0] != 0xFF:
+            return None
+        marker = hdr[1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / start of scan: no metadata beyond this point
+            return None
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 2
+            continue
+        length = struct.unpack(">H", hdr[2:4])[0]
+        if marker == 0xE1 and _read_at(f, pos + 4, 6) == b"Exif\x00\x00":
+            stamp = _tiff_date(f, pos + 10)
+            if stamp:
+                return stamp
+        pos += 2 + length
+    return None
+
+
+# ---- ISO BMFF (HEIF, MOV/MP4) -------------------------------------------------
+
+
+def _boxes(f: BinaryIO, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """(type, payload start, box end) for each box in [start, end)."""
+    pos = start
+    for _ in range(MAX_BOXES):
+        if pos + 8 > end:
+            return
+        hdr = _read_at(f, pos, 16)
+        if len(hdr) < 8:
+            return
+        size, typ = struct.unpack(">I4s", hdr[:8])
+        hlen = 8
+        if size == 1:
+            if len(hdr) < 16:
+                return
+            size = struct.unpack(">Q", hdr[8:16])[0]
+            hlen = 16
+        elif size == 0:
+            size = end - pos
+        if size < hlen:
+            return
+        yield typ, pos + hlen, min(pos + size, end)
+        pos += size
+
+
+def _uint(buf: bytes, pos: int, n: int) -> int:
+    return int.from_bytes(buf[pos:pos + n], "big")
+
+
+def _exif_item_id(iinf: bytes) -> Optional[int]:
+    pos = 6 if iinf[0] == 0 else 8
+    for typ, s, _ in _boxes(io.BytesIO(iinf), pos, len(iinf)):
+        if typ != b"infe" or iinf[s] < 2:  # item_type only exists from infe version 2
+            continue
+        p = s + 4
+        width = 2 if iinf[s] == 2 else 4
+        item_id = _uint(iinf, p, width)
+        p += width + 2  # item_ID, item_protection_index
+        if iinf[p:p + 4] == b"Exif":
+            return item_id
+    return None
+
+
+def _iloc_extents(iloc: bytes, want: int) -> Optional[tuple[int, list[tuple[int, int]]]]:
+    """(construction_method, [(offset, length)]) for item `want`."""
+    v = iloc[0]
+    offset_size, length_size = iloc[4] >> 4, iloc[4] & 0x0F
+    base_size = iloc[5] >> 4
+    index_size = iloc[5] & 0x0F if v in (1, 2) else 0
+    id_size = 2 if v < 2 else 4
+    p = 6
+    count = _uint(iloc, p, id_size)
+    p += id_size
+    for _ in range(count):
+        item_id = _uint(iloc, p, id_size)
+        p += id_size
+        method = 0
+        if v in (1, 2):
+            method = _uint(iloc, p, 2) & 0x0F
+            p += 2
+        p += 2  # data_reference_index
+        base = _uint(iloc, p, base_size)
+        p += base_size
+        n = _uint(iloc, p, 2)
+        p += 2
+        extents = []
+        for _ in range(n):
+            p += index_size
+            off = _uint(iloc, p, offset_size)
+            p += offset_size
+            length = _uint(iloc, p, length_size)
+            p += length_size
+            extents.append((base + off, length))
+        if item_id == want:
+            return method, extents
+    return None
+
+
+def _heif_date(f: BinaryIO, start: int, end: int) -> Optional[str]:
+    if end - start > MAX_META_BYTES:
+        return None
+    meta = _read_at(f, start, end - start)
+    children: dict[bytes, tuple[int, int]] = {}
+    for typ, s, e in _boxes(io.BytesIO(meta), 4, len(meta)):  # meta is a FullBox
+        children.setdefault(typ, (s, e))
+    if b"iinf" not in children or b"iloc" not in children:
+        return None
+
+    item_id = _exif_item_id(meta[slice(*children[b"iinf"])])
+    if item_id is None:
+        return None
+    loc = _iloc_extents(meta[slice(*children[b"iloc"])], item_id)
+    if loc is None:
+        return None
+    method, extents = loc
+    if method == 0:
+        src, origin = f, 0
+    elif method == 1 and b"idat" in children:
+        src, origin = io.BytesIO(meta), children[b"idat"][0]
+    else:
+        return None
+
+    item = b""
+    for off, length in extents:
+        item += _read_at(src, origin + off, min(length, MAX_EXIF_ITEM_BYTES - len(item)))
+    if len(item) < 4:
+        return None
+    # Exif item payload: 4-byte offset to the TIFF header (past an optional "Exif\0\0")
+    return _tiff_date(io.BytesIO(item), 4 + struct.unpack(">I", item[:4])[0])
+
+
+def _iso_day(text: str) -> Optional[str]:
+    m = ISO_DATE_RX.match(text.strip())
+    if not m:
+        return None
+    return _valid(f"{m.group(1)}:{m.group(2)}:{m.group(3)} {m.group(4) or '00'}:{m.group(5) or '00'}:{m.group(6) or '00'}")
+
+
+def _day_atom(f: BinaryIO, start: int, end: int) -> Optional[str]:
+    raw = _read_at(f, start, min(end - start, 256))
+    if raw[4:8] == b"data":  # iTunes-style ilst item: data box (type, locale, text)
+        text = raw[16:]
+    else:  # QuickTime user data text: length, language, text
+        text = raw[4:4 + _uint(raw, 0, 2)]
+    return _iso_day(text.decode("utf-8", "replace"))
+
+
+def _udta_day(f: BinaryIO, start: int, end: int) -> Optional[str]:
+    for typ, s, e in _boxes(f, start, end):
+        if typ == b"\xa9day":
+            stamp = _day_atom(f, s, e)
+            if stamp:
+                return stamp
+        elif typ == b"meta":
+            # iTunes meta is a FullBox; QuickTime meta is not (its first child follows directly)
+            first = s if _read_at(f, s + 4, 4) == b"hdlr" else s + 4
+            for t2, s2, e2 in _boxes(f, first, e):
+                if t2 != b"ilst":
+                    continue
+                for t3, s3, e3 in _boxes(f, s2, e2):
+                    if t3 == b"\xa9day":
+                        stamp = _day_atom(f, s3, e3)
+                        if stamp:
+                            return stamp
+    return None
+
+
+def _movie_date(f: BinaryIO, start: int, end: int) -> Optional[str]:
+    created = None
+    day = None
+    for typ, s, e in _boxes(f, start, end):
+        if typ == b"mvhd":
+            hdr = _read_at(f, s, 12)
+            secs = struct.unpack(">Q", hdr[4:12])[0] if hdr[0] == 1 else struct.unpack(">I", hdr[4:8])[0]
+            if secs:
+                try:
+                    created = (MOV_EPOCH + timedelta(seconds=secs)).strftime("%Y:%m:%d %H:%M:%S")
+                except OverflowError:
+                    created = None
+        elif typ == b"udta":
+            day = _udta_day(f, s, e)
+    return created or day
+
+
+def _bmff_date(f: BinaryIO, size: int) -> tuple[Optional[str], Optional[str]]:
+    moov = meta = None
+    for typ, s, e in _boxes(f, 0, size):
+        if typ == b"moov":
+            moov = (s, e)
+        elif typ == b"meta":
+            meta = (s, e)
+    if moov is not None:
+        return "quicktime", _movie_date(f, *moov)
+    if meta is not None:
+        return "heif", _heif_date(f, *meta)
+    return None, None
+
+
+# ---- entry point -----------------------------------------------------------------
+
+
+def capture_date(path: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    (container, "YYYY:MM:DD HH:MM:SS" or None) for a media file.
+
+    container is "jpeg", "tiff", "heif" or "quicktime" when the file was parsed
+    here (a None date then means the file carries none), and None for formats
+    (or damaged or unreadable files) this module cannot read -- use exiftool for those.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(12)
+            if head[:2] == b"\xff\xd8":
+                return "jpeg", _jpeg_date(f)
+            if head[:4] in (b"II*\x00", b"MM\x00*"):
+                return "tiff", _tiff_date(f, 0)
+            if head[4:8] in BMFF_TOP_LEVEL:
+                f.seek(0, io.SEEK_END)
+                return _bmff_date(f, f.tell())
+    # OSError: unreadable file, or a corrupt box size seeking before the start of the file
+    except (OSError, struct.error, IndexError, ValueError, OverflowError):
+        return None, None
+    return None, None
@@ -1,7 +1,9 @@
-"""Shared filename filters for pipeline scans."""
+"""Shared filename filters for pipeline scans, and AppleDouble cleanup for CANON."""
 
 from __future__ import annotations
 
+import os
+
 
 def should_skip_filename(name: str) -> bool:
     return (
@@ -13,3 +15,18 @@ def should_skip_filename(name: str) -> bool:
 
 def is_shafferography_sidecar(name: str) -> bool:
     return bool(name) and name.endswith(".shafferography.json")
+
+
+def remove_appledouble(root: str) -> int:
+    """Delete macOS `._*` files under root (ExFAT volumes grow them on copy); returns how many were removed."""
+    removed = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.startswith("._"):
+                path = os.path.join(dirpath, name)
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    print(f"WARNING: failed to remove AppleDouble file: {path}")
+    return removed
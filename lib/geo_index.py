@@ -0,0 +1,258 @@
+"""
+Spatial index over sidecar `geoData`: geohash cell -> canonical shas.
+
+Layout under the index root (default `MANIFESTS/geo_index/`):
+
+    geo.tsv    "<geohash>\\t<lat>\\t<lon>\\t<sha>\\t<ext>" rows, sorted by geohash then sha
+    geo.idx    sparse offset index: "<geohash>\\t<byte offset>" (lib/sorted_index.py)
+    seen.txt   "<sha>\\t<stamp>" for every sidecar already examined (with or without
+               usable coordinates); the stamp identifies that version of the sidecar
+
+Updating only reads sidecars whose sha is not in seen.txt or whose stamp has
+changed (a regenerated sidecar), replaces their points in geo.tsv in one
+streaming pass, and swaps the files in atomically.
+Geohashes sharing a prefix are contiguous in geo.tsv, so a bounding-box query
+covers the box with a handful of prefixes and scans just those row ranges.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import os
+from typing import Iterable, Iterator, Optional
+
+from lib.sorted_index import SparseIndex, SparseIndexWriter, fsync_replace
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5 m cells; coarser cells are prefixes of this
+
+# Upper bound on prefixes a query scans; coarser prefixes are used for larger boxes
+MAX_QUERY_CELLS = 64
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars: list[str] = []
+    bits = 0
+    n_bits = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        n_bits += 1
+        if n_bits == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            n_bits = 0
+    return "".join(chars)
+
+
+def _cell_size(precision: int) -> tuple[float, float]:
+    """(lat degrees, lon degrees) spanned by one geohash cell of this precision."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def sidecar_latlon(sidecar: dict) -> Optional[tuple[float, float]]:
+    """Usable (lat, lon) from a sidecar, or None. Takeout writes 0/0 when it has no location."""
+    geo = sidecar.get("geoData")
+    if not isinstance(geo, dict):
+        return None
+    lat, lon = geo.get("latitude"), geo.get("longitude")
+    if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+        return None
+    if lat == 0 and lon == 0:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return float(lat), float(lon)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_prefixes(lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> list[str]:
+    """Geohash prefixes whose cells cover the box (lon_min > lon_max means it crosses the antimeridian)."""
+    lon_ranges = [(lon_min, lon_max)] if lon_min <= lon_max else [(lon_min, 180.0), (-180.0, lon_max)]
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        dlat, dlon = _cell_size(precision)
+        rows = math.floor((lat_max + 90) / dlat) - math.floor((lat_min + 90) / dlat) + 1
+        cols = sum(math.floor((hi + 180) / dlon) - math.floor((lo + 180) / dlon) + 1 for lo, hi in lon_ranges)
+        if rows * cols <= MAX_QUERY_CELLS or precision == 1:
+            break
+
+    prefixes: set[str] = set()
+    i0 = math.floor((lat_min + 90) / dlat)
+    i1 = math.floor((lat_max + 90) / dlat)
+    for lo, hi in lon_ranges:
+        j0 = math.floor((lo + 180) / dlon)
+        j1 = math.floor((hi + 180) / dlon)
+        for i in range(i0, i1 + 1):
+            lat_c = min(89.999999, -90 + (i + 0.5) * dlat)
+            for j in range(j0, j1 + 1):
+                lon_c = min(179.999999, -180 + (j + 0.5) * dlon)
+                prefixes.add(geohash_encode(lat_c, lon_c, precision))
+    return sorted(prefixes)
+
+
+class GeoIndex:
+    def __init__(self, root: str):
+        self.root = root
+        self.table_path = os.path.join(root, "geo.tsv")
+        self.index_path = os.path.join(root, "geo.idx")
+        self.seen_path = os.path.join(root, "seen.txt")
+
+        self._sparse = SparseIndex(self.index_path)
+
+    # ---- writing -------------------------------------------------------
+
+    def seen(self) -> dict[str, str]:
+        """sha -> stamp of the sidecar version last examined ("" for entries written before stamps)."""
+        if not os.path.isfile(self.seen_path):
+            return {}
+        out: dict[str, str] = {}
+        with open(self.seen_path, "r", encoding="utf-8") as f:
+            for ln in f:
+                sha, _, stamp = ln.rstrip("\n").partition("\t")
+                if sha:
+                    out[sha] = stamp
+        return out
+
+    def add(self, examined: dict[str, str], points: Iterable[tuple[str, str, float, float]]) -> int:
+        """
+        Record examined shas (sha -> sidecar stamp) and merge their (sha, ext, lat, lon) points into the table.
+
+        Existing rows of examined shas are replaced, so a sidecar that lost or
+        changed its coordinates leaves no stale point. Returns the total row
+        count of the rewritten table.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        new_rows = sorted(
+            (geohash_encode(lat, lon), f"{lat:.7f}", f"{lon:.7f}", sha, ext) for sha, ext, lat, lon in points
+        )
+
+        def old_rows() -> Iterator[tuple[str, ...]]:
+            if not os.path.isfile(self.table_path):
+                return
+            with open(self.table_path, "r", encoding="utf-8") as f:
+                for ln in f:
+                    row = tuple(ln.rstrip("\n").split("\t"))
+                    if row[3] not in examined:
+                        yield row
+
+        tmp_table = self.table_path + ".tmp"
+        tmp_idx = self.index_path + ".tmp"
+        count = 0
+        with open(tmp_table, "w", encoding="utf-8", newline="") as out, open(tmp_idx, "w", encoding="utf-8") as idx:
+            sparse = SparseIndexWriter(out, idx)
+            for row in heapq.merge(old_rows(), new_rows):
+                sparse.row(row[0])
+                out.write("\t".join(row) + "\n")
+                count += 1
+
+        tmp_seen = self.seen_path + ".tmp"
+        with open(tmp_seen, "w", encoding="utf-8") as f:
+            f.write("".join(f"{sha}\t{stamp}\n" for sha, stamp in sorted({**self.seen(), **examined}.items())))
+
+        # Table and index move together; seen.txt goes last so a crash only means re-reading some sidecars
+        fsync_replace(tmp_table, self.table_path)
+        fsync_replace(tmp_idx, self.index_path)
+        fsync_replace(tmp_seen, self.seen_path)
+        self._sparse.invalidate()
+        return count
+
+    def reset(self) -> None:
+        for p in (self.table_path, self.index_path, self.seen_path):
+            if os.path.isfile(p):
+                os.remove(p)
+        self._sparse.invalidate()
+
+    # ---- reading -------------------------------------------------------
+
+    def iter_rows(self) -> Iterator[tuple[str, float, float, str, str]]:
+        """Every (geohash, lat, lon, sha, ext) row, in geohash order."""
+        if not os.path.isfile(self.table_path):
+            return
+        with open(self.table_path, "r", encoding="utf-8") as f:
+            for ln in f:
+                gh, lat, lon, sha, ext = ln.rstrip("\n").split("\t")
+                yield gh, float(lat), float(lon), sha, ext
+
+    def _prefix_rows(self, fh, prefix: str) -> Iterator[tuple[str, float, float, str, str]]:
+        offset = self._sparse.start_offset(prefix)
+        if offset is None:
+            return
+        fh.seek(offset)
+        for raw in fh:
+            line = raw.decode("utf-8")
+            gh = line[: line.find("\t")]
+            if gh < prefix:
+                continue
+            if not gh.startswith(prefix):
+                break
+            _, lat, lon, sha, ext = line.rstrip("\n").split("\t")
+            yield gh, float(lat), float(lon), sha, ext
+
+    def query_bbox(
+        self, lat_min: float, lon_min: float, lat_max: float, lon_max: float
+    ) -> list[tuple[str, float, float, str, str]]:
+        """Rows inside the box; lon_min > lon_max selects a box crossing the antimeridian."""
+        if not self._sparse:
+            return []
+
+        def in_lon(lon: float) -> bool:
+            return lon_min <= lon <= lon_max if lon_min <= lon_max else lon >= lon_min or lon <= lon_max
+
+        hits: list[tuple[str, float, float, str, str]] = []
+        with open(self.table_path, "rb") as fh:
+            for prefix in covering_prefixes(lat_min, lon_min, lat_max, lon_max):
+                for row in self._prefix_rows(fh, prefix):
+                    if lat_min <= row[1] <= lat_max and in_lon(row[2]):
+                        hits.append(row)
+        return hits
+
+    def query_radius(self, lat: float, lon: float, km: float) -> list[tuple[float, tuple[str, float, float, str, str]]]:
+        """(distance_km, row) pairs within `km` of the point, nearest first."""
+        dlat = math.degrees(km / EARTH_RADIUS_KM)
+        lat_min, lat_max = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+        cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        if lat_min <= -90 or lat_max >= 90 or cos_lat <= 1e-9 or dlat / cos_lat >= 180:
+            lon_min, lon_max = -180.0, 180.0
+        else:
+            dlon = dlat / cos_lat
+            lon_min = (lon - dlon + 180) % 360 - 180
+            lon_max = (lon + dlon + 180) % 360 - 180
+
+        hits = []
+        for row in self.query_bbox(lat_min, lon_min, lat_max, lon_max):
+            d = haversine_km(lat, lon, row[1], row[2])
+            if d <= km:
+                hits.append((d, row))
+        hits.sort(key=lambda h: (h[0], h[1][3]))
+        return hits
@@ -0,0 +1,159 @@
+"""
+Reading and writing pipeline manifests (dedup plans, already-in-canon, inventory).
+
+Manifests are CSV with a header row. `MANIFEST_FORMAT` selects how new ones are
+written:
+
+- `csv`     plain CSV (default; human-readable audit trail)
+- `csv.gz`  gzip-compressed CSV
+- `csv.zst` zstd-compressed CSV (needs the optional `zstandard` package)
+
+Callers always name the plain `.csv` path; `resolve_manifest()` finds whichever
+encoding is on disk, and `iter_manifest()` streams it back as namedtuples
+rather than one dict per row.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import os
+from collections import namedtuple
+from typing import IO, Any, Iterable, Iterator, Optional, Sequence
+
+from lib.env import optional_env
+
+MANIFEST_FORMATS = ("csv", "csv.gz", "csv.zst")
+_SUFFIXES = {"csv": "", "csv.gz": ".gz", "csv.zst": ".zst"}
+
+
+def manifest_format() -> str:
+    fmt = optional_env("MANIFEST_FORMAT", "csv").strip().lower()
+    if fmt not in MANIFEST_FORMATS:
+        raise SystemExit(f"ERROR: MANIFEST_FORMAT must be one of {', '.join(MANIFEST_FORMATS)} (got {fmt!r})")
+    if fmt == "csv.zst":
+        _zstd()
+    return fmt
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise SystemExit("ERROR: zstd manifests need the 'zstandard' package (pip install zstandard)")
+    return zstandard
+
+
+class _GzipWriter(gzip.GzipFile):
+    """GzipFile over an already open file, which it closes too (plain GzipFile leaves `fileobj` open)."""
+
+    def __init__(self, fileobj: IO[bytes], header_name: str):
+        # The header records `header_name` (gunzip -N restores it); mtime=0 keeps output deterministic across reruns
+        super().__init__(filename=header_name, mode="wb", fileobj=fileobj, mtime=0)
+        self._owned = fileobj
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._owned.close()
+
+
+def _open_text(path: str, mode: str, codec_path: Optional[str] = None) -> IO[str]:
+    """Open a manifest as text; the codec comes from `codec_path` (default: `path`) suffix."""
+    codec_path = codec_path or path
+    if codec_path.endswith(".gz"):
+        # Written under a temp name, so the header gets the final name instead
+        raw = _GzipWriter(open(path, "wb"), codec_path) if mode == "w" else gzip.open(path, mode + "b")
+        return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    if codec_path.endswith(".zst"):
+        zstd = _zstd()
+        if mode == "w":
+            raw = zstd.ZstdCompressor(level=10).stream_writer(open(path, "wb"), closefd=True)
+        else:
+            raw = zstd.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def resolve_manifest(csv_path: str) -> Optional[str]:
+    """Return the on-disk file for a logical `.csv` manifest path (any encoding), or None."""
+    preferred = _SUFFIXES[manifest_format()]
+    for suffix in [preferred] + [s for s in _SUFFIXES.values() if s != preferred]:
+        p = csv_path + suffix
+        if os.path.isfile(p):
+            return p
+    return None
+
+
+def require_manifest(csv_path: str) -> str:
+    p = resolve_manifest(csv_path)
+    if p is None:
+        raise SystemExit(f"ERROR: expected manifest not found: {csv_path}")
+    return p
+
+
+def write_manifest(
+    csv_path: str,
+    fields: Sequence[str],
+    rows: Iterable[Any],
+    fmt: Optional[str] = None,
+) -> str:
+    """
+    Write rows (dicts or sequences in `fields` order) to `csv_path` in the chosen format.
+
+    The file is written to a temp name and renamed into place; copies of the same
+    manifest in other encodings are removed so readers never see a stale one.
+    """
+    fmt = fmt or manifest_format()
+    out_path = csv_path + _SUFFIXES[fmt]
+    tmp_path = out_path + ".tmp"
+    with _open_text(tmp_path, "w", codec_path=out_path) as f:
+        w = csv.writer(f)
+        w.writerow(fields)
+        for row in rows:
+            if isinstance(row, dict):
+                w.writerow([row.get(k, "") for k in fields])
+            else:
+                w.writerow(row)
+    os.replace(tmp_path, out_path)
+
+    for suffix in _SUFFIXES.values():
+        other = csv_path + suffix
+        if other != out_path and os.path.isfile(other):
+            os.remove(other)
+    return out_path
+
+
+def manifest_fields(path: str) -> list[str]:
+    with _open_text(path, "r") as f:
+        return next(csv.reader(f), [])
+
+
+def iter_manifest(path: str, required: Sequence[str] = ()) -> Iterator[Any]:
+    """
+    Stream a manifest as namedtuples (one attribute per header column).
+
+    Raises SystemExit if any `required` column is missing from the header.
+    """
+    with _open_text(path, "r") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        missing = [c for c in required if c not in header]
+        if missing:
+            raise SystemExit(f"ERROR: manifest {path} is missing columns: {', '.join(missing)}")
+        Row = namedtuple("Row", header, rename=True)
+        width = len(header)
+        for values in reader:
+            if len(values) != width:
+                values = (values + [""] * width)[:width]
+            yield Row._make(values)
+
+
+def read_manifest_dicts(path: str) -> Iterator[dict]:
+    """Dict rows, for the few callers that genuinely need mutable/mergeable rows."""
+    for row in iter_manifest(path):
+        yield row._asdict()
@@ -0,0 +1,187 @@
+"""
+Cumulative cross-run provenance index: sha256 -> every occurrence in every run.
+
+Layout under the index root (default `MANIFESTS/provenance_index/`):
+
+    compacted.csv      all compacted rows, sorted by sha256 (then run, role, account, path)
+    compacted.idx      sparse offset index: "<sha>\\t<byte offset>" at sha-group starts
+    runs.txt           run labels folded into compacted.csv
+    pending/<run>.csv  rows appended since the last compaction, one file per run
+
+Appending a run only writes its pending file. Compaction merges pending rows into
+compacted.csv in one streaming pass and swaps the new files in atomically. A run
+that is appended again replaces its earlier rows, whether pending or compacted.
+"""
+
+from __future__ import annotations
+
+import csv
+import heapq
+import io
+import os
+from collections import defaultdict
+from typing import Iterable, Iterator, Optional
+
+from lib.sorted_index import SparseIndex, SparseIndexWriter, fsync_replace
+
+FIELDS = ["sha256", "ext", "role", "account", "relativePath", "absPath", "runLabel"]
+
+# Roles an occurrence can have in a run's manifests
+ROLE_CANONICAL = "canonical"            # dedup_plan__unique.csv
+ROLE_DUPLICATE = "duplicate"            # dedup_plan__duplicates.csv
+ROLE_ALREADY_IN_CANON = "already_in_canon"  # already_in_canon.csv
+
+def _sort_key(row: dict) -> tuple[str, str, str, str, str]:
+    return (row["sha256"], row["runLabel"], row["role"], row["account"], row["relativePath"])
+
+
+class ProvenanceIndex:
+    def __init__(self, root: str):
+        self.root = root
+        self.compacted_path = os.path.join(root, "compacted.csv")
+        self.index_path = os.path.join(root, "compacted.idx")
+        self.runs_path = os.path.join(root, "runs.txt")
+        self.pending_dir = os.path.join(root, "pending")
+
+        self._sparse = SparseIndex(self.index_path)
+        self._pending_by_sha: Optional[dict[str, list[dict]]] = None
+        self._pending_run_set: set[str] = set()
+        self._fh: Optional[io.BufferedReader] = None
+
+    # ---- writing -------------------------------------------------------
+
+    def append_run(self, run_label: str, rows: Iterable[dict]) -> int:
+        """Record one run's occurrences as a pending segment (replacing any earlier append of that run)."""
+        os.makedirs(self.pending_dir, exist_ok=True)
+        rows_sorted = sorted(
+            ({k: (r.get(k) or "") for k in FIELDS} | {"runLabel": run_label} for r in rows),
+            key=_sort_key,
+        )
+        final_path = os.path.join(self.pending_dir, f"{run_label}.csv")
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=FIELDS)
+            w.writeheader()
+            w.writerows(rows_sorted)
+        fsync_replace(tmp_path, final_path)
+        self._pending_by_sha = None
+        return len(rows_sorted)
+
+    def pending_runs(self) -> list[str]:
+        if not os.path.isdir(self.pending_dir):
+            return []
+        return sorted(fn[: -len(".csv")] for fn in os.listdir(self.pending_dir) if fn.endswith(".csv"))
+
+    def compacted_runs(self) -> list[str]:
+        if not os.path.isfile(self.runs_path):
+            return []
+        with open(self.runs_path, "r", encoding="utf-8") as f:
+            return [ln.strip() for ln in f if ln.strip()]
+
+    def compact(self) -> int:
+        """Fold every pending segment into compacted.csv. Returns the compacted row count (0 if nothing pending)."""
+        pending = self.pending_runs()
+        if not pending:
+            return 0
+        self.close()
+        os.makedirs(self.root, exist_ok=True)
+        pending_set = set(pending)
+
+        pending_rows: list[dict] = []
+        for run in pending:
+            with open(os.path.join(self.pending_dir, f"{run}.csv"), newline="", encoding="utf-8") as f:
+                pending_rows.extend(csv.DictReader(f))
+        pending_rows.sort(key=_sort_key)
+
+        def old_rows() -> Iterator[dict]:
+            if not os.path.isfile(self.compacted_path):
+                return
+            with open(self.compacted_path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if row["runLabel"] not in pending_set:
+                        yield row
+
+        tmp_csv = self.compacted_path + ".tmp"
+        tmp_idx = self.index_path + ".tmp"
+        count = 0
+        with open(tmp_csv, "w", newline="", encoding="utf-8") as out, open(tmp_idx, "w", encoding="utf-8") as idx:
+            w = csv.DictWriter(out, fieldnames=FIELDS)
+            w.writeheader()
+            sparse = SparseIndexWriter(out, idx)
+            for row in heapq.merge(old_rows(), pending_rows, key=_sort_key):
+                sparse.row(row["sha256"])
+                w.writerow({k: row.get(k, "") for k in FIELDS})
+                count += 1
+
+        runs = sorted(set(self.compacted_runs()) | pending_set)
+        tmp_runs = self.runs_path + ".tmp"
+        with open(tmp_runs, "w", encoding="utf-8") as f:
+            f.write("".join(f"{r}\n" for r in runs))
+
+        # compacted.csv and its index must move together; pending files go last so a
+        # crash in between only means the same rows get merged (idempotently) again.
+        fsync_replace(tmp_csv, self.compacted_path)
+        fsync_replace(tmp_idx, self.index_path)
+        fsync_replace(tmp_runs, self.runs_path)
+        for run in pending:
+            os.remove(os.path.join(self.pending_dir, f"{run}.csv"))
+
+        self._sparse.invalidate()
+        self._pending_by_sha = None
+        return count
+
+    # ---- reading -------------------------------------------------------
+
+    def _load_pending(self) -> None:
+        self._pending_by_sha = defaultdict(list)
+        self._pending_run_set = set(self.pending_runs())
+        for run in self._pending_run_set:
+            with open(os.path.join(self.pending_dir, f"{run}.csv"), newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    self._pending_by_sha[row["sha256"]].append(row)
+
+    def _compacted_rows(self, sha: str) -> list[dict]:
+        offset = self._sparse.start_offset(sha)
+        if offset is None:
+            return []
+        if self._fh is None:
+            self._fh = open(self.compacted_path, "rb")
+        self._fh.seek(offset)
+
+        rows: list[dict] = []
+        for raw in self._fh:
+            line = raw.decode("utf-8")
+            row_sha = line[: line.find(",")]
+            if row_sha < sha:
+                continue
+            if row_sha > sha:
+                break
+            values = next(csv.reader([line]))
+            rows.append(dict(zip(FIELDS, values)))
+        return rows
+
+    def lookup(self, sha: str) -> list[dict]:
+        """Every recorded occurrence of `sha` across all runs (compacted + pending)."""
+        sha = sha.lower()
+        if self._pending_by_sha is None:
+            self._load_pending()
+        assert self._pending_by_sha is not None
+        rows = [r for r in self._compacted_rows(sha) if r["runLabel"] not in self._pending_run_set]
+        rows.extend(self._pending_by_sha.get(sha, []))
+        rows.sort(key=_sort_key)
+        return rows
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def rows_from_run_manifests(unique_rows: Iterable[dict], dup_rows: Iterable[dict], already_rows: Iterable[dict]) -> Iterator[dict]:
+    for role, rows in (
+        (ROLE_CANONICAL, unique_rows),
+        (ROLE_DUPLICATE, dup_rows),
+        (ROLE_ALREADY_IN_CANON, already_rows),
+    ):
+        for r in rows:
+            yield {**r, "role": role}
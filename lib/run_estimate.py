@@ -0,0 +1,249 @@
+"""
+Metadata-only cost estimate for an ingest run (`build_run_plan.py --dry-run`).
+
+Nothing is hashed or read: staged trees are stat'ed, unstaged ZIPs in
+`GOOGLE_TAKEOUT/<account>/zips/` and in `ZIP_SRC_<account>` (where the ZIP
+watcher picks them up) are listed from their central directory, and each file
+is classified against what the archive already holds:
+
+- known:       its absPath is in a prior run manifest and the canonical for
+               that sha has the same size
+- size match:  some canonical has the same size (typically a re-download of
+               already-ingested media under a new ZIP stem)
+- new:         no canonical has this size, so it cannot be in CANON
+
+Only "new" files are predicted to be copied and get sidecars, one per distinct
+size (duplicates within a run are byte-identical, so they share a size). Stage
+times come from `MANIFESTS/throughput_history.jsonl`, which the unzip (ZIP
+watcher), hash (planner), copy (materialize) and sidecar stages append to.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import zipfile
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+from lib.fs_filters import is_shafferography_sidecar, should_skip_filename
+from lib.manifests import iter_manifest, resolve_manifest
+from lib.run_plan import ALREADY_IN_CANON_CSV_NAME, DUP_CSV_NAME, RX_CANON, UNIQUE_CSV_NAME, is_media
+
+THROUGHPUT_HISTORY_NAME = "throughput_history.jsonl"
+CANON_INVENTORY_NAME = "canonical_inventory__by-hash.csv"
+
+STAGE_UNZIP = "unzip"
+STAGE_HASH = "hash"
+STAGE_COPY = "copy"
+STAGE_SIDECARS = "sidecars"
+
+# Rate = total work / total seconds over this many most recent runs of a stage
+HISTORY_WINDOW = 10
+
+
+def history_path(photo_archive: str) -> str:
+    return os.path.join(photo_archive, "MANIFESTS", THROUGHPUT_HISTORY_NAME)
+
+
+def record_throughput(
+    photo_archive: str, stage: str, run_label: str, files: int, nbytes: int, seconds: float
+) -> None:
+    """Append one stage measurement to the throughput history (no-op for empty stages)."""
+    if files <= 0 or seconds <= 0:
+        return
+    rec = {
+        "stage": stage,
+        "runLabel": run_label,
+        "files": files,
+        "bytes": nbytes,
+        "seconds": round(seconds, 3),
+        "host": socket.gethostname(),
+        "recordedAt": datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+    }
+    path = history_path(photo_archive)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, sort_keys=True) + "\n")
+
+
+def load_throughput(photo_archive: str) -> dict[str, list[dict]]:
+    """stage -> measurements, oldest first."""
+    by_stage: dict[str, list[dict]] = {}
+    path = history_path(photo_archive)
+    if not os.path.isfile(path):
+        return by_stage
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted append
+            by_stage.setdefault(rec.get("stage", ""), []).append(rec)
+    return by_stage
+
+
+def stage_rate(history: dict[str, list[dict]], stage: str, unit: str = "bytes") -> Optional[float]:
+    """Recent `unit` per second for a stage, or None without history."""
+    recent = [r for r in history.get(stage, []) if r.get(unit, 0) > 0 and r.get("seconds", 0) > 0]
+    recent = recent[-HISTORY_WINDOW:]
+    if not recent:
+        return None
+    return sum(r[unit] for r in recent) / sum(r["seconds"] for r in recent)
+
+
+def load_canon_sizes(photo_archive: str, canon: str) -> dict[str, int]:
+    """sha -> canonical size, from the inventory manifest when present, else by stat'ing CANON."""
+    path = resolve_manifest(os.path.join(photo_archive, "MANIFESTS", CANON_INVENTORY_NAME))
+    sizes: dict[str, int] = {}
+    if path is not None:
+        for row in iter_manifest(path, required=("sha256", "bytes")):
+            sizes[row.sha256.lower()] = int(row.bytes)
+    # Canonicals added since the inventory was written
+    with os.scandir(canon) as it:
+        for entry in it:
+            if should_skip_filename(entry.name) or is_shafferography_sidecar(entry.name):
+                continue
+            m = RX_CANON.match(entry.name)
+            if m and m.group("sha").lower() not in sizes:
+                sizes[m.group("sha").lower()] = entry.stat().st_size
+    return sizes
+
+
+def load_prior_paths(manifests_root: str) -> dict[str, str]:
+    """absPath -> sha256 across every prior run's plan manifests."""
+    prior: dict[str, str] = {}
+    if not os.path.isdir(manifests_root):
+        return prior
+    for run in sorted(os.listdir(manifests_root)):
+        run_dir = os.path.join(manifests_root, run)
+        if not os.path.isdir(run_dir):
+            continue
+        for name in (UNIQUE_CSV_NAME, DUP_CSV_NAME, ALREADY_IN_CANON_CSV_NAME):
+            path = resolve_manifest(os.path.join(run_dir, name))
+            if path is None:
+                continue
+            for row in iter_manifest(path, required=("sha256", "absPath")):
+                prior[row.absPath] = row.sha256.lower()
+    return prior
+
+
+def pending_zips(
+    takeout_root: str,
+    accounts: Sequence[str],
+    zip_stems: Sequence[str] = (),
+    src_dirs: Optional[dict[str, str]] = None,
+) -> list[tuple[str, str, str]]:
+    """
+    (account, zip path, future unzipped/<stem> dir) for ZIPs not yet unzipped.
+
+    Looks in `zips/` first, then in the account's entry of `src_dirs`
+    (ZIP_SRC_<account>); a stem found in both is listed once. ZIPs without a
+    readable central directory (still downloading) are left out.
+    """
+    out: list[tuple[str, str, str]] = []
+    for acct in accounts:
+        base = os.path.join(takeout_root, acct, "unzipped")
+        seen: set[str] = set()
+        for zips_dir in (os.path.join(takeout_root, acct, "zips"), (src_dirs or {}).get(acct, "")):
+            if not zips_dir or not os.path.isdir(zips_dir):
+                continue
+            for fn in sorted(os.listdir(zips_dir)):
+                if not fn.lower().endswith(".zip") or should_skip_filename(fn):
+                    continue
+                stem = fn[:-4]
+                if stem in seen or (zip_stems and stem not in zip_stems):
+                    continue
+                seen.add(stem)
+                zip_path = os.path.join(zips_dir, fn)
+                dest = os.path.join(base, stem)
+                if os.path.isdir(dest) or _unzipped_flat(zip_path, base) or not zipfile.is_zipfile(zip_path):
+                    continue
+                out.append((acct, zip_path, dest))
+    return out
+
+
+def _unzipped_flat(zip_path: str, base: str) -> bool:
+    """True if the ZIP was expanded straight into `unzipped/` (run_everything.sh layout)."""
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and is_media(info.filename):
+                    p = os.path.join(base, info.filename)
+                    return os.path.isfile(p) and os.path.getsize(p) == info.file_size
+    except (OSError, zipfile.BadZipFile):
+        return False
+    return False
+
+
+def zip_media(zip_path: str, dest: str) -> tuple[list[tuple[str, int]], int]:
+    """([(future absPath, size)] for media entries, total uncompressed bytes), from the central directory."""
+    media: list[tuple[str, int]] = []
+    total = 0
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                continue
+            if should_skip_filename(os.path.basename(info.filename)):
+                continue
+            total += info.file_size
+            if is_media(info.filename):
+                media.append((os.path.join(dest, info.filename), info.file_size))
+    return media, total
+
+
+class RunEstimate:
+    """Running tallies for one dry run; feed it (absPath, size) pairs."""
+
+    def __init__(self, canon_sizes: dict[str, int], prior_paths: dict[str, str]):
+        self.canon_sizes = canon_sizes
+        self.size_set = set(canon_sizes.values())
+        self.prior_paths = prior_paths
+
+        self.files = 0
+        self.bytes = 0
+        self.known = [0, 0]       # [files, bytes]
+        self.size_match = [0, 0]
+        self.new = [0, 0]
+        # Copies of one item (other accounts, albums, "name(1).jpg") share its size; count each size once
+        self._new_sizes: set[int] = set()
+        self.new_unique_bytes = 0
+
+    def add(self, abs_path: str, size: int) -> None:
+        self.files += 1
+        self.bytes += size
+        sha = self.prior_paths.get(abs_path)
+        if sha is not None and self.canon_sizes.get(sha) == size:
+            tally = self.known
+        elif size in self.size_set:
+            tally = self.size_match
+        else:
+            tally = self.new
+            if size not in self._new_sizes:
+                self._new_sizes.add(size)
+                self.new_unique_bytes += size
+        tally[0] += 1
+        tally[1] += size
+
+    @property
+    def new_unique_files(self) -> int:
+        return len(self._new_sizes)
+
+
+def fmt_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(n) < 1024 or unit == "TiB":
+            return f"{n:,.0f} {unit}" if unit == "B" else f"{n:,.1f} {unit}"
+        n /= 1024
+    return f"{n:,.1f} TiB"
+
+
+def fmt_seconds(s: Optional[float]) -> str:
+    if s is None:
+        return "unknown (no throughput history)"
+    if s < 90:
+        return f"{s:,.0f}s"
+    if s < 5400:
+        return f"{s / 60:,.1f} min"
+    return f"{s / 3600:,.1f} h"
@@ -0,0 +1,269 @@
+"""
+Shared planning logic: enumerate Takeout media, hash it, and turn occurrences
+into the unique / duplicate / already-in-canon manifests.
+
+Used by the single-process planner (`build_run_plan.py`), sharded planning
+(`build_partial_plan.py` + `merge_partial_plans.py`) and the streaming pipeline
+(`run_streaming_pipeline.py`), so every path applies exactly the same
+precedence rules and writes byte-identical manifests.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+from lib.albums import album_of
+from lib.fs_filters import is_shafferography_sidecar, should_skip_filename
+from lib.manifests import write_manifest
+from lib.read_schedule import iter_sha256, order_paths
+
+MEDIA_EXTS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".heic", ".tif", ".tiff",
+    ".mp4", ".mov", ".m4v", ".avi", ".3gp", ".mpg", ".mpeg", ".webm",
+}
+
+# Canonical filename pattern: <64-hex-sha256><ext>
+RX_CANON = re.compile(r"^(?P<sha>[0-9a-f]{64})(?P<ext>\.[^./\\]+)$", re.IGNORECASE)
+
+UNIQUE_FIELDS = [
+    "sha256",
+    "ext",
+    "account",
+    "relativePath",
+    "absPath",
+    "runLabel",
+    "preferredAccount",
+    "occurrences",
+]
+DUP_FIELDS = [
+    "sha256",
+    "ext",
+    "account",
+    "relativePath",
+    "absPath",
+    "runLabel",
+    "preferredAccount",
+]
+ALREADY_FIELDS = ["sha256", "ext", "account", "relativePath", "absPath", "runLabel"]
+
+UNIQUE_CSV_NAME = "dedup_plan__unique.csv"
+DUP_CSV_NAME = "dedup_plan__duplicates.csv"
+ALREADY_IN_CANON_CSV_NAME = "already_in_canon.csv"
+
+# Partial plans: one hashed shard of one account, merged later by merge_partial_plans.py
+PARTIALS_DIR_NAME = "partials"
+# Album columns were added later; older partials without them still merge
+OCCURRENCE_REQUIRED_FIELDS = ["sha256", "ext", "account", "takeoutRoot", "relativePath", "absPath"]
+OCCURRENCE_FIELDS = OCCURRENCE_REQUIRED_FIELDS + ["albumFolder", "albumTitle"]
+
+
+def is_media(p: str) -> bool:
+    return Path(p).suffix.lower() in MEDIA_EXTS
+
+
+def load_canon_hashes(canon: str) -> set[str]:
+    """Existing canonical hashes, from CANON filenames."""
+    if not os.path.isdir(canon):
+        raise SystemExit(f"ERROR: CANON directory does not exist: {canon}")
+    hashes: set[str] = set()
+    for fn in os.listdir(canon):
+        if should_skip_filename(fn) or is_shafferography_sidecar(fn):
+            continue
+        m = RX_CANON.match(fn)
+        if not m:
+            continue
+        hashes.add(m.group("sha").lower())
+    return hashes
+
+
+def enumerate_media(
+    takeout_root: str,
+    accounts: Sequence[str],
+    zip_stems: Sequence[str] = (),
+) -> tuple[dict[str, tuple[str, str, str]], list[str]]:
+    """
+    Walk each account's `unzipped/` tree (or only `unzipped/<stem>` for `zip_stems`).
+
+    Returns ({absPath: (account, base, filename)}, [missing directories]).
+    """
+    candidates: dict[str, tuple[str, str, str]] = {}
+    missing: list[str] = []
+
+    for acct in accounts:
+        base = os.path.join(takeout_root, acct, "unzipped")
+        if not os.path.isdir(base):
+            missing.append(base)
+            continue
+
+        scan_roots = [base]
+        if zip_stems:
+            scan_roots = [os.path.join(base, stem) for stem in zip_stems]
+            scan_roots = [d for d in scan_roots if os.path.isdir(d)]
+            if not scan_roots:
+                missing.append(os.path.join(base, "{" + ",".join(zip_stems) + "}"))
+                continue
+
+        for scan_root in scan_roots:
+            for dirpath, _, filenames in os.walk(scan_root):
+                for fn in filenames:
+                    if should_skip_filename(fn):
+                        continue
+
+                    p = os.path.join(dirpath, fn)
+                    if not is_media(p):
+                        continue
+
+                    candidates[p] = (acct, base, fn)
+
+    return candidates, missing
+
+
+def make_occurrence(acct: str, base: str, path: str) -> dict:
+    rel = os.path.relpath(path, base)
+    album_folder, album_title = album_of(base, rel)
+    return {
+        "account": acct,
+        "takeoutRoot": base,
+        "relativePath": rel,
+        "absPath": path,
+        "ext": Path(path).suffix.lower(),
+        "albumFolder": album_folder,
+        "albumTitle": album_title,
+    }
+
+
+def hash_occurrences(
+    candidates: dict[str, tuple[str, str, str]],
+    read_order: str,
+    readahead_files: int,
+    drop_cache: bool,
+    paths: Optional[Sequence[str]] = None,
+) -> Iterator[tuple[str, dict]]:
+    """Hash every candidate in `read_order` (or exactly `paths`, if given), yielding (sha256, occurrence)."""
+    if paths is None:
+        paths = order_paths(candidates, read_order)
+    for p, sha in iter_sha256(paths, readahead_files=readahead_files, drop_cache=drop_cache):
+        acct, base, _ = candidates[p]
+        yield sha.lower(), make_occurrence(acct, base, p)
+
+
+def account_rank(accounts: Sequence[str], preferred_account: str) -> dict[str, int]:
+    """Account -> position in precedence order (preferred first, then by name), matching `precedence_key`."""
+    ordered = sorted(accounts, key=lambda a: (0 if a == preferred_account else 1, a))
+    return {a: i for i, a in enumerate(ordered)}
+
+
+def precedence_ordered_paths(
+    candidates: dict[str, tuple[str, str, str]],
+    ranks: dict[str, int],
+    read_order: str,
+) -> list[str]:
+    """Candidates grouped account by account in precedence order, each group in `read_order`."""
+    by_account: dict[str, list[str]] = {}
+    for p, (acct, _, _) in candidates.items():
+        by_account.setdefault(acct, []).append(p)
+    paths: list[str] = []
+    for acct in sorted(by_account, key=lambda a: ranks[a]):
+        paths.extend(order_paths(by_account[acct], read_order))
+    return paths
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """Parse an "i/n" shard spec into (i, n)."""
+    try:
+        i_s, n_s = spec.strip().split("/", 1)
+        i, n = int(i_s), int(n_s)
+    except ValueError:
+        raise SystemExit(f"ERROR: shard spec must look like i/n (got {spec!r})")
+    if n < 1 or not 0 <= i < n:
+        raise SystemExit(f"ERROR: shard spec out of range: {spec!r}")
+    return i, n
+
+
+def precedence_key(rec: dict, preferred_account: str) -> tuple[int, str, str]:
+    """Sort key deciding which occurrence of a sha becomes the canonical copy."""
+    return (
+        0 if rec["account"] == preferred_account else 1,
+        rec["account"],
+        rec["relativePath"],
+    )
+
+
+def plan_rows(
+    records_by_sha: dict[str, list[dict]],
+    already_by_sha: dict[str, list[dict]],
+    preferred_account: str,
+    run_label: str,
+) -> tuple[list[dict], list[dict], list[dict]]:
+    """Apply account precedence and build (unique, duplicate, already-in-canon) manifest rows."""
+    unique_rows: list[dict] = []
+    dup_rows: list[dict] = []
+
+    for sha, recs in records_by_sha.items():
+        recs_sorted = sorted(recs, key=lambda r: precedence_key(r, preferred_account))
+        canonical = recs_sorted[0]
+
+        unique_rows.append(
+            {
+                "sha256": sha,
+                "ext": canonical["ext"],
+                "account": canonical["account"],
+                "relativePath": canonical["relativePath"],
+                "absPath": canonical["absPath"],
+                "runLabel": run_label,
+                "preferredAccount": preferred_account,
+                "occurrences": str(len(recs)),
+            }
+        )
+
+        for r in recs_sorted[1:]:
+            dup_rows.append(
+                {
+                    "sha256": sha,
+                    "ext": r["ext"],
+                    "account": r["account"],
+                    "relativePath": r["relativePath"],
+                    "absPath": r["absPath"],
+                    "runLabel": run_label,
+                    "preferredAccount": preferred_account,
+                }
+            )
+
+    unique_rows.sort(key=lambda r: r["sha256"])
+    dup_rows.sort(key=lambda r: (r["sha256"], r["account"], r["relativePath"]))
+
+    # “Already in canon” report (for audit/debug)
+    already_rows: list[dict] = []
+    for sha, recs in already_by_sha.items():
+        for r in sorted(recs, key=lambda x: (x["account"], x["relativePath"])):
+            already_rows.append(
+                {
+                    "sha256": sha,
+                    "ext": r["ext"],
+                    "account": r["account"],
+                    "relativePath": r["relativePath"],
+                    "absPath": r["absPath"],
+                    "runLabel": run_label,
+                }
+            )
+    already_rows.sort(key=lambda r: (r["sha256"], r["account"], r["relativePath"]))
+
+    return unique_rows, dup_rows, already_rows
+
+
+def write_plan(
+    out_dir: str,
+    unique_rows: Iterable[dict],
+    dup_rows: Iterable[dict],
+    already_rows: Iterable[dict],
+    fmt: Optional[str] = None,
+) -> tuple[str, str, str]:
+    os.makedirs(out_dir, exist_ok=True)
+    return (
+        write_manifest(os.path.join(out_dir, UNIQUE_CSV_NAME), UNIQUE_FIELDS, unique_rows, fmt=fmt),
+        write_manifest(os.path.join(out_dir, DUP_CSV_NAME), DUP_FIELDS, dup_rows, fmt=fmt),
+        write_manifest(os.path.join(out_dir, ALREADY_IN_CANON_CSV_NAME), ALREADY_FIELDS, already_rows, fmt=fmt),
+    )
@@ -0,0 +1,201 @@
+"""Packed sidecar store: sharded JSONL packs keyed by sha with an offset index.
+
+Layout (one pack per run, written atomically):
+
+    <root>/<RUN_LABEL>/
+        pack.json          pack metadata (runLabel, createdAt, count, shards)
+        shard-<x>.jsonl    one compact JSON record per line, x = sha[0]
+        index.tsv          sha256, ext, shard, offset, length (sorted by sha)
+
+When the same sha appears in more than one pack, the most recently created
+pack wins.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Iterator, Optional
+
+PACK_META = "pack.json"
+PACK_INDEX = "index.tsv"
+PACK_VERSION = 1
+
+
+def write_sidecar_file(path: str, sidecar: dict) -> None:
+    """Write a per-file `.shafferography.json` sidecar (the canonical on-disk formatting)."""
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump(sidecar, out, ensure_ascii=False, indent=2)
+        out.write("\n")
+
+
+def _shard_name(sha: str) -> str:
+    return f"shard-{sha[0]}.jsonl"
+
+
+class SidecarPackWriter:
+    """
+    Collects sidecars for one run and publishes them as a single pack.
+
+    Records are buffered in memory and only written on `commit()`, into a
+    hidden temp directory that is renamed into place, so readers never see a
+    partial pack.
+    """
+
+    def __init__(self, root: str, label: str):
+        if not label or label.startswith(".") or os.sep in label:
+            raise ValueError(f"invalid pack label: {label!r}")
+        self.root = root
+        self.label = label
+        self._records: dict[str, tuple[str, dict]] = {}
+
+    def add(self, sha: str, ext: str, sidecar: dict) -> None:
+        self._records[sha.lower()] = (ext, sidecar)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def commit(self) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        final_dir = os.path.join(self.root, self.label)
+        tmp_dir = os.path.join(self.root, f".{self.label}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        index_rows: list[tuple[str, str, str, int, int]] = []
+        shards: dict[str, Any] = {}
+        try:
+            for sha in sorted(self._records):
+                ext, sidecar = self._records[sha]
+                shard = _shard_name(sha)
+                f = shards.get(shard)
+                if f is None:
+                    f = shards[shard] = open(os.path.join(tmp_dir, shard), "wb")
+                line = json.dumps(
+                    {"sha256": sha, "ext": ext, "sidecar": sidecar},
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                ).encode("utf-8") + b"\n"
+                index_rows.append((sha, ext, shard, f.tell(), len(line)))
+                f.write(line)
+        finally:
+            for f in shards.values():
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+
+        with open(os.path.join(tmp_dir, PACK_INDEX), "w", encoding="utf-8", newline="") as f:
+            for sha, ext, shard, offset, length in index_rows:
+                f.write(f"{sha}\t{ext}\t{shard}\t{offset}\t{length}\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        meta = {
+            "version": PACK_VERSION,
+            "runLabel": self.label,
+            "createdAt": datetime.now(timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z"),
+            "count": len(index_rows),
+            "shards": sorted(shards),
+        }
+        with open(os.path.join(tmp_dir, PACK_META), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Re-running a label replaces its pack; the old one is moved aside first
+        # because directories cannot be atomically replaced when non-empty.
+        old_dir = os.path.join(self.root, f".{self.label}.old")
+        if os.path.isdir(final_dir):
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.rename(final_dir, old_dir)
+        os.rename(tmp_dir, final_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return final_dir
+
+
+class SidecarStore:
+    """
+    Read-only view over every committed pack under `root`.
+
+    `get()` does one seek + read per sha via the offset index; `iter_sidecars()`
+    streams every live record pack by pack, shard by shard, for bulk import.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.packs: list[str] = []
+        self._created: dict[str, str] = {}
+        # sha -> (pack_dir, ext, shard, offset, length); later packs override earlier ones
+        self._index: dict[str, tuple[str, str, str, int, int]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.isdir(self.root):
+            return
+        found: list[tuple[str, str]] = []
+        for name in os.listdir(self.root):
+            if name.startswith("."):
+                continue
+            meta_path = os.path.join(self.root, name, PACK_META)
+            if not os.path.isfile(meta_path):
+                continue
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            found.append((str(meta.get("createdAt", "")), name))
+
+        for created_at, name in sorted(found):
+            pack_dir = os.path.join(self.root, name)
+            self.packs.append(pack_dir)
+            self._created[pack_dir] = created_at
+            with open(os.path.join(pack_dir, PACK_INDEX), "r", encoding="utf-8") as f:
+                for line in f:
+                    sha, ext, shard, offset, length = line.rstrip("\n").split("\t")
+                    self._index[sha] = (pack_dir, ext, shard, int(offset), int(length))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, sha: str) -> bool:
+        return sha.lower() in self._index
+
+    def shas(self) -> list[str]:
+        return sorted(self._index)
+
+    def ext(self, sha: str) -> Optional[str]:
+        hit = self._index.get(sha.lower())
+        return hit[1] if hit else None
+
+    def stamp(self, sha: str) -> Optional[str]:
+        """Identifies the live record for `sha`: changes whenever a newer pack (or a rerun of its label) supersedes it."""
+        hit = self._index.get(sha.lower())
+        if hit is None:
+            return None
+        return f"{os.path.basename(hit[0])}@{self._created[hit[0]]}"
+
+    def get(self, sha: str) -> Optional[dict]:
+        hit = self._index.get(sha.lower())
+        if hit is None:
+            return None
+        pack_dir, _, shard, offset, length = hit
+        with open(os.path.join(pack_dir, shard), "rb") as f:
+            f.seek(offset)
+            rec = json.loads(f.read(length))
+        return rec["sidecar"]
+
+    def iter_sidecars(self) -> Iterator[tuple[str, str, dict]]:
+        """Yield (sha, ext, sidecar) for every live record, reading each shard sequentially."""
+        for pack_dir in self.packs:
+            shards = sorted(
+                fn for fn in os.listdir(pack_dir) if fn.startswith("shard-") and fn.endswith(".jsonl")
+            )
+            for shard in shards:
+                with open(os.path.join(pack_dir, shard), "rb") as f:
+                    for line in f:
+                        rec = json.loads(line)
+                        sha = rec["sha256"]
+                        if self._index.get(sha, ("",))[0] != pack_dir:
+                            continue
+                        yield sha, rec["ext"], rec["sidecar"]
@@ -0,0 +1,78 @@
+"""
+Shared plumbing for the on-disk sorted tables (`provenance_index`, `geo_index`).
+
+Each keeps one table sorted by a text key in its first column plus a sparse
+offset index, "<key>\\t<byte offset>" roughly every INDEX_EVERY_ROWS rows and
+always at the start of a key group, so a lookup seeks to the last entry at or
+before its key and scans forward. Rewrites go to temp files that are fsync'ed
+and swapped in with `fsync_replace`.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+from typing import IO, Optional
+
+# One sparse index entry roughly every this many rows
+INDEX_EVERY_ROWS = 256
+
+
+def fsync_replace(tmp_path: str, final_path: str) -> None:
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
+
+
+class SparseIndexWriter:
+    """Writes index entries to `idx` while the sorted table is written to `out`; call `row(key)` before each row."""
+
+    def __init__(self, out: IO, idx: IO, every: int = INDEX_EVERY_ROWS):
+        self.out = out
+        self.idx = idx
+        self.every = every
+        self._prev: Optional[str] = None
+        self._since = every
+
+    def row(self, key: str) -> None:
+        if key != self._prev:
+            if self._since >= self.every:
+                self.out.flush()
+                self.idx.write(f"{key}\t{self.out.tell()}\n")
+                self._since = 0
+            self._prev = key
+        self._since += 1
+
+
+class SparseIndex:
+    """Reader for a sparse offset index; loaded on first use, `invalidate()` after the table is rewritten."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._keys: Optional[list[str]] = None
+        self._offsets: list[int] = []
+
+    def _load(self) -> list[str]:
+        if self._keys is None:
+            self._keys = []
+            self._offsets = []
+            if os.path.isfile(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for ln in f:
+                        key, off = ln.rstrip("\n").split("\t")
+                        self._keys.append(key)
+                        self._offsets.append(int(off))
+        return self._keys
+
+    def invalidate(self) -> None:
+        self._keys = None
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def start_offset(self, key: str) -> Optional[int]:
+        """Byte offset to scan from for rows with `key` (or keys starting with it); None for an empty table."""
+        keys = self._load()
+        if not keys:
+            return None
+        return self._offsets[max(0, bisect.bisect_right(keys, key) - 1)]
@@ -0,0 +1,388 @@
+"""
+Takeout JSON -> Shafferography sidecar construction.
+
+No env access at import time, so that `write_sidecars_from_takeout.py` can
+hand chunks of shas to worker processes, including under the `spawn` start
+method. `ChunkPool` is the shared chunk/submit/collect loop for those workers
+(and for thumbnail rendering).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+from lib.sidecar_store import SidecarPackWriter, write_sidecar_file
+
+PHOTO_URL_RX = re.compile(r"/photo/([^/?#]+)")
+DUPLICATE_MEDIA_RX = re.compile(r"^(?P<stem>.+)\((?P<idx>\d+)\)(?P<ext>\.[^.]+)$")
+
+
+def now_utc_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def find_takeout_metadata_json(media_abs_path: str) -> Optional[str]:
+    p = Path(media_abs_path)
+    candidates: list[Path] = []
+    expected_title = p.name
+
+    # Takeout duplicate variants often look like:
+    # media: "07(1).jpg" -> metadata: "07.jpg.supplemental-metadata(1).json"
+    dup_match = DUPLICATE_MEDIA_RX.match(p.name)
+    if dup_match:
+        stem = dup_match.group("stem")
+        ext = dup_match.group("ext")
+        idx = dup_match.group("idx")
+        base_title = f"{stem}{ext}"
+        expected_title = base_title
+        candidates.append(p.with_name(f"{base_title}.supplemental-metadata({idx}).json"))
+        candidates.append(p.with_name(f"{base_title}.supplemental-metadata.json"))
+
+    # Existing lookup behavior (kept for backward compatibility)
+    candidates.append(Path(str(p) + ".json"))
+    candidates.append(Path(str(p) + ".supplemental-metadata.json"))
+    candidates.append(Path(str(p.with_suffix("")) + ".supplemental-metadata.json"))
+
+    existing: list[Path] = []
+    seen: set[str] = set()
+    for cand in candidates:
+        cand_str = str(cand)
+        if cand_str in seen:
+            continue
+        seen.add(cand_str)
+        if cand.is_file():
+            existing.append(cand)
+
+    if not existing:
+        return None
+    if len(existing) == 1:
+        return str(existing[0])
+
+    # Prefer the metadata whose title matches the intended media title
+    for cand in existing:
+        try:
+            with cand.open("r", encoding="utf-8") as f:
+                js = json.load(f)
+        except Exception:
+            continue
+        title = js.get("title")
+        if isinstance(title, str) and title == expected_title:
+            return str(cand)
+
+    # Fall back to first existing candidate if title-based disambiguation fails
+    return str(existing[0])
+
+
+def deep_find_first_string_key(obj: Any, keys: set[str]) -> Optional[str]:
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k in keys and isinstance(v, str) and v.strip():
+                return v.strip()
+            found = deep_find_first_string_key(v, keys)
+            if found:
+                return found
+    elif isinstance(obj, list):
+        for it in obj:
+            found = deep_find_first_string_key(it, keys)
+            if found:
+                return found
+    return None
+
+
+def extract_google_photo_ids(js: dict) -> list[str]:
+    ids: set[str] = set()
+    url = js.get("url")
+    if isinstance(url, str):
+        m = PHOTO_URL_RX.search(url)
+        if m:
+            ids.add(m.group(1))
+
+    for key in ("photoId", "mediaId", "googlePhotoId", "id"):
+        v = deep_find_first_string_key(js, {key})
+        if v and len(v) >= 10 and "http" not in v:
+            ids.add(v)
+
+    return sorted(ids)
+
+
+def extract_people(js: dict) -> list[str]:
+    people: list[str] = []
+    raw = js.get("people")
+    if isinstance(raw, list):
+        for p in raw:
+            if isinstance(p, dict):
+                name = p.get("name")
+                if isinstance(name, str) and name.strip():
+                    people.append(name.strip())
+    return sorted(set(people))
+
+
+def extract_geo(js: dict) -> Optional[dict]:
+    g = js.get("geoData")
+    if isinstance(g, dict):
+        out: dict[str, Any] = {}
+        for k in ("latitude", "longitude", "altitude", "latitudeSpan", "longitudeSpan"):
+            v = g.get(k)
+            out[k] = v if isinstance(v, (int, float)) else None
+        if all(out[k] is None for k in out):
+            return None
+        return out
+    return None
+
+
+def extract_taken_at_iso(js: dict) -> Optional[str]:
+    photo_taken = js.get("photoTakenTime")
+    if not isinstance(photo_taken, dict):
+        return None
+
+    ts = photo_taken.get("timestamp")
+    if isinstance(ts, str):
+        ts = ts.strip()
+    if ts is None or ts == "":
+        return None
+
+    try:
+        sec = int(ts)
+    except (ValueError, TypeError):
+        return None
+
+    return datetime.fromtimestamp(sec, tz=timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def _load_json(path: str, cache: dict[str, Optional[dict]]) -> Optional[dict]:
+    if path not in cache:
+        try:
+            with open(path, "r", encoding="utf-8") as jf:
+                cache[path] = json.load(jf)
+        except Exception:
+            cache[path] = None
+    return cache[path]
+
+
+def build_sidecar(
+    uniq: dict,
+    occs: list[dict],
+    photo_archive: str,
+    takeout_batch_id: str,
+    ingest_tool: str,
+    imported_at: str,
+) -> tuple[dict, bool]:
+    """
+    Build the sidecar for one canonical from its plan row and every known occurrence.
+
+    Returns (sidecar, any_json) where any_json says whether any occurrence had a
+    Takeout metadata JSON.
+    """
+    meta_paths: dict[str, Optional[str]] = {}
+    json_cache: dict[str, Optional[dict]] = {}
+
+    def meta_for(abs_path: str) -> Optional[str]:
+        if abs_path not in meta_paths:
+            meta_paths[abs_path] = find_takeout_metadata_json(abs_path)
+        return meta_paths[abs_path]
+
+    google_ids: set[str] = set()
+    people: set[str] = set()
+    geo_choice: Optional[dict] = None
+
+    occs_sorted = sorted(
+        occs,
+        key=lambda r: (
+            0 if r.get("absPath") == uniq.get("absPath") else 1,
+            r.get("account", ""),
+            r.get("relativePath", ""),
+        ),
+    )
+
+    any_json = False
+    for occ in occs_sorted:
+        meta_path = meta_for(occ.get("absPath", ""))
+        if not meta_path:
+            continue
+        any_json = True
+        js = _load_json(meta_path, json_cache)
+        if js is None:
+            continue
+
+        for gid in extract_google_photo_ids(js):
+            google_ids.add(gid)
+        for nm in extract_people(js):
+            people.add(nm)
+
+        if geo_choice is None:
+            g = extract_geo(js)
+            if g is not None:
+                geo_choice = g
+
+    original_filename = os.path.basename(uniq["absPath"])
+    original_takeout_path = os.path.join(
+        "GOOGLE_TAKEOUT", uniq["account"], "unzipped", uniq["relativePath"]
+    )
+
+    meta_abs = meta_for(uniq["absPath"])
+    original_meta_path = ""
+    if meta_abs:
+        try:
+            original_meta_path = os.path.relpath(meta_abs, photo_archive)
+        except Exception:
+            original_meta_path = meta_abs
+
+    google_ids_sorted = sorted(google_ids)
+    primary_google_id = google_ids_sorted[0] if google_ids_sorted else ""
+    taken_at_iso = None
+    for occ in occs_sorted:
+        meta_path = meta_for(occ.get("absPath", ""))
+        if not meta_path:
+            continue
+        js = _load_json(meta_path, json_cache)
+        if js is None:
+            continue
+        taken_at_iso = extract_taken_at_iso(js)
+        if taken_at_iso:
+            break
+
+    sidecar = {
+        "version": 1,
+        "source": {
+            "system": "google-photos-takeout",
+            "googlePhotoIds": google_ids_sorted,
+            "googlePhotoId": primary_google_id,
+        },
+        "provenance": {
+            "takeoutBatchId": takeout_batch_id,
+            "importedAt": imported_at,
+            "ingestTool": ingest_tool,
+        },
+        "original": {
+            "filename": original_filename,
+            "takeoutPath": original_takeout_path,
+            "metadataPath": original_meta_path,
+        },
+        "people": sorted(people),
+        "geoData": geo_choice,
+    }
+    if taken_at_iso:
+        sidecar["takenAtIso"] = taken_at_iso
+        sidecar["takenAtSource"] = "google-takeout-photoTakenTime"
+    return sidecar, any_json
+
+
+def merge_occurrence_history(history: list[dict], run_occs: list[dict]) -> list[dict]:
+    """One occurrence per absPath: cross-run history first, then this run's plan rows."""
+    # Same file re-staged in several runs shows up once per run; keep one row per path.
+    by_path: dict[str, dict] = {}
+    for occ in history + run_occs:
+        by_path.setdefault(occ.get("absPath", ""), occ)
+    return list(by_path.values())
+
+
+def write_sidecar_chunk(
+    tasks: list[tuple[str, str, dict, list[dict]]],
+    canon: str,
+    photo_archive: str,
+    takeout_batch_id: str,
+    ingest_tool: str,
+    imported_at: str,
+    write_files: bool,
+    return_sidecars: bool,
+) -> list[tuple[str, str, Optional[dict], bool, Optional[str]]]:
+    """
+    Build (and optionally write) sidecars for a chunk of (sha, ext, uniq, occs) tasks.
+
+    Returns one (sha, ext, sidecar-or-None, any_json, error-or-None) per task;
+    a failure on one sha is reported in its result rather than raised.
+    """
+    results: list[tuple[str, str, Optional[dict], bool, Optional[str]]] = []
+    for sha, ext, uniq, occs in tasks:
+        try:
+            sidecar, any_json = build_sidecar(uniq, occs, photo_archive, takeout_batch_id, ingest_tool, imported_at)
+            if write_files:
+                write_sidecar_file(os.path.join(canon, f"{sha}{ext}.shafferography.json"), sidecar)
+        except Exception as e:
+            results.append((sha, ext, None, False, f"{type(e).__name__}: {e}"))
+            continue
+        results.append((sha, ext, sidecar if return_sidecars else None, any_json, None))
+    return results
+
+
+class ChunkPool:
+    """
+    Runs a chunk function (`write_sidecar_chunk`, `render_chunk`) over chunks of tasks.
+
+    With one worker chunks run in-process as they are submitted; otherwise on a
+    process pool, so `submit()` can be called while tasks are still being
+    produced. `results()` waits for every chunk. When a chunk fails as a whole
+    (e.g. its worker process died), `failed(task, error)` stands in for the
+    result of each of its tasks.
+    """
+
+    def __init__(self, fn: Callable[..., list], args: Sequence, workers: int, failed: Callable[[Any, str], Any]):
+        self.fn = fn
+        self.args = tuple(args)
+        self.workers = max(1, workers)
+        self.failed = failed
+        self._pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self._futures: list[tuple[Future, Sequence]] = []
+        self._results: list = []
+
+    def submit(self, chunk: Sequence) -> None:
+        if self._pool is None:
+            self._results.extend(self.fn(chunk, *self.args))
+        else:
+            self._futures.append((self._pool.submit(self.fn, chunk, *self.args), chunk))
+
+    def map(self, tasks: Sequence, chunk_size: int) -> list:
+        for i in range(0, len(tasks), chunk_size):
+            self.submit(tasks[i:i + chunk_size])
+        return self.results()
+
+    def results(self) -> list:
+        for fut, chunk in self._futures:
+            try:
+                self._results.extend(fut.result())
+            except Exception as e:
+                err = f"worker failed: {type(e).__name__}: {e}"
+                self._results.extend(self.failed(task, err) for task in chunk)
+        self._futures.clear()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        return self._results
+
+
+def sidecar_chunk_failed(task: tuple[str, str, dict, list[dict]], error: str) -> tuple[str, str, None, bool, str]:
+    """`write_sidecar_chunk` result for a task whose whole chunk failed."""
+    return task[0], task[1], None, False, error
+
+
+def publish_sidecar_results(
+    results: list[tuple[str, str, Optional[dict], bool, Optional[str]]],
+    pack_writer: Optional[SidecarPackWriter],
+    failures: list[tuple[str, str]],
+) -> tuple[int, int, Optional[str]]:
+    """
+    Tally `write_sidecar_chunk` results, appending errors to `failures`, then commit the pack.
+
+    The pack is only published when nothing failed (including failures already
+    in the list), so a label's pack is never replaced by an incomplete one; a
+    rerun of the label writes it. Returns (written, missing_json, pack dir or None).
+    """
+    written = 0
+    missing_json = 0
+    for sha, ext, sidecar, any_json, error in sorted(results, key=lambda r: r[0]):
+        if error is not None:
+            failures.append((sha, error))
+            continue
+        if not any_json:
+            missing_json += 1
+        if pack_writer is not None and sidecar is not None:
+            pack_writer.add(sha, ext, sidecar)
+        written += 1
+    pack_dir = pack_writer.commit() if pack_writer is not None and not failures else None
+    return written, missing_json, pack_dir
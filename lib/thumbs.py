@@ -0,0 +1,136 @@
+"""
+Content-addressed thumbnail cache for canonicals.
+
+Thumbnails live at `DERIVED/thumbs/<sha[:2]>/<sha>_<size>.<fmt>` (longest edge
+= size). Canonicals never change, so an existing thumbnail is always valid and
+the cache never needs invalidating; a run only renders what is missing.
+
+Images are decoded with Pillow (optional dependency; HEIC additionally needs
+`pillow-heif`). Videos get a poster frame via `ffmpeg` when it is on PATH.
+Like `lib/takeout_sidecar.py`, nothing here reads env at import time, so
+chunks can be handed to worker processes.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Optional, Sequence
+
+THUMB_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+VIDEO_EXTS = {".mp4", ".mov", ".m4v", ".avi", ".3gp", ".mpg", ".mpeg", ".webm"}
+HEIF_EXTS = {".heic", ".heif"}
+
+
+def _pil():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise SystemExit("ERROR: thumbnails need the 'Pillow' package (pip install Pillow)")
+    try:
+        # HEIC/HEIF support is optional; without it callers skip those canonicals (has_heif())
+        from pillow_heif import register_heif_opener
+
+        register_heif_opener()
+    except ImportError:
+        pass
+    return Image, ImageOps
+
+
+def require_pillow() -> None:
+    _pil()
+
+
+def has_ffmpeg() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def has_heif() -> bool:
+    return importlib.util.find_spec("pillow_heif") is not None
+
+
+def thumb_path(root: str, sha: str, size: int, fmt: str = "webp") -> str:
+    return os.path.join(root, sha[:2], f"{sha}_{size}.{fmt}")
+
+
+def missing_sizes(root: str, sha: str, sizes: Sequence[int], fmt: str = "webp") -> list[int]:
+    return [s for s in sizes if not os.path.isfile(thumb_path(root, sha, s, fmt))]
+
+
+def _poster_frame(src: str, out_png: str) -> None:
+    # Frame 1s in avoids black fade-ins; very short clips fall back to the first frame
+    for seek in ("1", "0"):
+        cmd = [
+            "ffmpeg", "-v", "error", "-y", "-ss", seek, "-i", src,
+            "-frames:v", "1", "-f", "image2", "-c:v", "png", out_png,
+        ]
+        p = subprocess.run(cmd, capture_output=True, text=True)
+        # Seeking past the end exits 0 without writing anything
+        if p.returncode == 0 and os.path.isfile(out_png) and os.path.getsize(out_png) > 0:
+            return
+    raise RuntimeError(f"ffmpeg could not extract a frame: {p.stderr.strip()[:200]}")
+
+
+def render_thumbs(src: str, root: str, sha: str, ext: str, sizes: Sequence[int], fmt: str, quality: int) -> int:
+    """
+    Render the given sizes of one canonical; returns bytes written.
+
+    The source is decoded once and downscaled from the largest size to the
+    smallest. Each thumbnail is written to a temp name and renamed into place,
+    so an interrupted run never leaves a truncated file behind.
+    """
+    Image, ImageOps = _pil()
+    pil_format = THUMB_FORMATS[fmt]
+    sizes = sorted(sizes, reverse=True)
+
+    with tempfile.TemporaryDirectory(prefix="thumb-") as tmp:
+        if ext in VIDEO_EXTS:
+            frame = os.path.join(tmp, "frame.png")
+            _poster_frame(src, frame)
+            src = frame
+
+        with Image.open(src) as im:
+            # JPEG can decode at 1/2, 1/4 or 1/8 scale directly, which is most of the win on large photos
+            im.draft("RGB", (sizes[0], sizes[0]))
+            im = ImageOps.exif_transpose(im)
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "PA") else "RGB")
+            if pil_format == "JPEG" and im.mode == "RGBA":
+                im = im.convert("RGB")
+
+            written = 0
+            for size in sizes:
+                im.thumbnail((size, size), Image.LANCZOS)
+                out = thumb_path(root, sha, size, fmt)
+                os.makedirs(os.path.dirname(out), exist_ok=True)
+                tmp_out = out + ".tmp"
+                im.save(tmp_out, format=pil_format, quality=quality)
+                os.replace(tmp_out, out)
+                written += os.path.getsize(out)
+    return written
+
+
+def render_chunk(
+    tasks: Sequence[tuple[str, str, str, Sequence[int]]],
+    root: str,
+    fmt: str,
+    quality: int,
+) -> list[tuple[str, int, int, Optional[str]]]:
+    """
+    Worker entry point: tasks are (sha, ext, src_path, sizes).
+
+    Returns (sha, source_bytes, thumb_bytes, error) per task; one bad canonical
+    never takes the rest of the chunk down with it.
+    """
+    results: list[tuple[str, int, int, Optional[str]]] = []
+    for sha, ext, src, sizes in tasks:
+        try:
+            src_bytes = os.path.getsize(src)
+            results.append((sha, src_bytes, render_thumbs(src, root, sha, ext, sizes, fmt, quality), None))
+        except Exception as e:
+            results.append((sha, 0, 0, f"{type(e).__name__}: {e}"))
+    return results
@@ -0,0 +1,77 @@
+"""
+Directory change notification for the ZIP_SRC watcher.
+
+`DirWatcher.wait(timeout)` returns when something in a watched directory
+changed (or the timeout elapsed). On Linux it uses inotify through ctypes;
+everywhere else (or if inotify is unavailable) it simply sleeps, and the
+caller's periodic rescan acts as the polling fallback.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class DirWatcher:
+    def __init__(self, dirs: list[str], backend: str = "auto"):
+        if backend not in ("auto", "inotify", "poll"):
+            raise ValueError(f"unknown watch backend {backend!r}")
+        self.backend = "poll"
+        self._fd = -1
+        if backend in ("auto", "inotify"):
+            self._init_inotify(dirs)
+        if backend == "inotify" and self.backend != "inotify":
+            raise SystemExit("ERROR: WATCH_BACKEND=inotify requested but inotify is unavailable")
+
+    def _init_inotify(self, dirs: list[str]) -> None:
+        if not sys.platform.startswith("linux"):
+            return
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            return
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        for d in dirs:
+            if libc.inotify_add_watch(fd, os.fsencode(d), mask) < 0:
+                os.close(fd)
+                return
+        self._fd = fd
+        self.backend = "inotify"
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to `timeout` seconds; True if a change notification arrived."""
+        if self._fd < 0:
+            time.sleep(timeout)
+            return False
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        # Drain pending events; the caller rescans the directories anyway.
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import time
+
+from lib.env import require_env, optional_env, split_env
+from lib.read_schedule import READ_ORDER_POLICIES, drop_cached_pages, iter_sha256, order_paths
+from lib.run_plan import enumerate_media
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+ACCOUNTS = split_env("ACCOUNTS_STR")  # REQUIRED (via env.py)
+
+TAKEOUT_ROOT = os.path.join(PHOTO_ARCHIVE, "GOOGLE_TAKEOUT")
+
+# Which policies to compare, how many readahead files, and an optional cap on files scanned
+BENCH_POLICIES = split_env("BENCH_POLICIES", default=" ".join(READ_ORDER_POLICIES))
+BENCH_READAHEAD_FILES = [int(x) for x in split_env("BENCH_READAHEAD_FILES", default="0 4")]
+BENCH_MAX_FILES = int(optional_env("BENCH_MAX_FILES", "0"))
+
+for policy in BENCH_POLICIES:
+    if policy not in READ_ORDER_POLICIES:
+        raise SystemExit(f"ERROR: unknown policy in BENCH_POLICIES: {policy!r}")
+
+candidates, missing_unzipped = enumerate_media(TAKEOUT_ROOT, ACCOUNTS)
+if missing_unzipped:
+    raise SystemExit("ERROR: missing expected unzipped takeout directories:\n" + "\n".join(missing_unzipped))
+paths = list(candidates)
+
+if BENCH_MAX_FILES:
+    paths = paths[:BENCH_MAX_FILES]
+
+total_bytes = sum(os.path.getsize(p) for p in paths)
+print(f"Benchmark set: {len(paths):,} files, {total_bytes / 1e9:,.2f} GB")
+if not hasattr(os, "posix_fadvise"):
+    print("NOTE: posix_fadvise unavailable; cache is not dropped between passes (use `sudo purge` on macOS)")
+
+print(f"{'policy':<8} {'readahead':>9} {'order s':>8} {'hash s':>8} {'MB/s':>8}")
+for policy in BENCH_POLICIES:
+    for readahead in BENCH_READAHEAD_FILES:
+        # Start every pass from a cold page cache so passes don't help each other
+        for p in paths:
+            drop_cached_pages(p)
+
+        t0 = time.monotonic()
+        ordered = order_paths(paths, policy)
+        t1 = time.monotonic()
+        for _ in iter_sha256(ordered, readahead_files=readahead, drop_cache=True):
+            pass
+        t2 = time.monotonic()
+
+        mbps = (total_bytes / 1e6) / (t2 - t1) if t2 > t1 else 0.0
+        print(f"{policy:<8} {readahead:>9} {t1 - t0:>8.2f} {t2 - t1:>8.2f} {mbps:>8.1f}")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+import zlib
+
+from lib.env import require_env, optional_env, split_env
+from lib.manifests import manifest_format, write_manifest
+from lib.read_schedule import READ_ORDER_POLICIES
+from lib.run_plan import (
+    OCCURRENCE_FIELDS,
+    PARTIALS_DIR_NAME,
+    enumerate_media,
+    hash_occurrences,
+    parse_shard,
+)
+from lib.takeout_sidecar import now_utc_iso
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+RUN_LABEL = optional_env("RUN_LABEL", "run")
+
+# The one account this partial covers (precedence is applied later, by merge_partial_plans.py)
+PARTIAL_ACCOUNT = require_env("PARTIAL_ACCOUNT")
+# Optional: only these unzipped ZIP folders of that account
+PARTIAL_ZIP_STEMS = split_env("PARTIAL_ZIP_STEMS", default="")
+# Optional: "i/n" keeps only files whose crc32(relativePath) % n == i
+PARTIAL_SHARD = optional_env("PARTIAL_SHARD", "0/1")
+PARTIAL_ID = optional_env("PARTIAL_ID", "")
+# Where to write the partial (default: MANIFESTS/<RUN_LABEL>/partials); copy it to the merge machine from there
+PARTIAL_OUT_DIR = optional_env(
+    "PARTIAL_OUT_DIR", os.path.join(PHOTO_ARCHIVE, "MANIFESTS", RUN_LABEL, PARTIALS_DIR_NAME)
+)
+
+MANIFEST_FORMAT = manifest_format()
+
+HASH_READ_ORDER = optional_env("HASH_READ_ORDER", "extent").strip().lower()
+HASH_READAHEAD_FILES = int(optional_env("HASH_READAHEAD_FILES", "4"))
+HASH_DROP_CACHE = optional_env("HASH_DROP_CACHE", "1") == "1"
+
+TAKEOUT_ROOT = os.path.join(PHOTO_ARCHIVE, "GOOGLE_TAKEOUT")
+
+if HASH_READ_ORDER not in READ_ORDER_POLICIES:
+    raise SystemExit(
+        f"ERROR: HASH_READ_ORDER must be one of {', '.join(READ_ORDER_POLICIES)} (got {HASH_READ_ORDER!r})"
+    )
+
+shard_index, shard_count = parse_shard(PARTIAL_SHARD)
+
+if not PARTIAL_ID:
+    parts = [PARTIAL_ACCOUNT]
+    if PARTIAL_ZIP_STEMS:
+        parts.append("+".join(PARTIAL_ZIP_STEMS))
+    parts.append(f"{shard_index}of{shard_count}")
+    PARTIAL_ID = "__".join(parts)
+
+candidates, missing_unzipped = enumerate_media(TAKEOUT_ROOT, [PARTIAL_ACCOUNT], PARTIAL_ZIP_STEMS)
+
+if missing_unzipped:
+    msg = "ERROR: missing expected unzipped takeout directories:\n" + "\n".join(missing_unzipped)
+    raise SystemExit(msg)
+
+if shard_count > 1:
+    candidates = {
+        p: v
+        for p, v in candidates.items()
+        if zlib.crc32(os.path.relpath(p, v[1]).encode("utf-8")) % shard_count == shard_index
+    }
+
+hash_started = time.monotonic()
+occurrences = [
+    dict(rec, sha256=sha)
+    for sha, rec in hash_occurrences(candidates, HASH_READ_ORDER, HASH_READAHEAD_FILES, HASH_DROP_CACHE)
+]
+hash_seconds = time.monotonic() - hash_started
+
+occurrences.sort(key=lambda r: (r["sha256"], r["relativePath"]))
+
+os.makedirs(PARTIAL_OUT_DIR, exist_ok=True)
+occ_out = write_manifest(
+    os.path.join(PARTIAL_OUT_DIR, f"{PARTIAL_ID}.occurrences.csv"), OCCURRENCE_FIELDS, occurrences
+)
+
+meta = {
+    "partialId": PARTIAL_ID,
+    "runLabel": RUN_LABEL,
+    "account": PARTIAL_ACCOUNT,
+    "zipStems": PARTIAL_ZIP_STEMS,
+    "shard": f"{shard_index}/{shard_count}",
+    "takeoutRoot": TAKEOUT_ROOT,
+    "host": socket.gethostname(),
+    "files": len(occurrences),
+    "uniqueHashes": len({r["sha256"] for r in occurrences}),
+    "hashSeconds": round(hash_seconds, 3),
+    "createdAt": now_utc_iso(),
+}
+meta_out = os.path.join(PARTIAL_OUT_DIR, f"{PARTIAL_ID}.meta.json")
+with open(meta_out + ".tmp", "w", encoding="utf-8") as f:
+    json.dump(meta, f, indent=2)
+    f.write("\n")
+os.replace(meta_out + ".tmp", meta_out)
+
+print(f"Partial: {PARTIAL_ID} (account={PARTIAL_ACCOUNT}, shard={shard_index}/{shard_count})")
+if PARTIAL_ZIP_STEMS:
+    print(f"Scoped to ZIP folders: {', '.join(PARTIAL_ZIP_STEMS)}")
+print(f"Hashed media files: {len(occurrences):,} in {hash_seconds:,.1f}s ({HASH_READ_ORDER} order)")
+print(f"Wrote: {occ_out}")
+print(f"Wrote: {meta_out}")
@@ -1,15 +1,32 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import csv
-import hashlib
 import os
-import re
+import sys
+import time
 from collections import defaultdict
-from pathlib import Path
 
+from lib.albums import membership_rows, write_album_membership
 from lib.env import require_env, optional_env, split_env
-from lib.fs_filters import is_shafferography_sidecar, should_skip_filename
+from lib.manifests import manifest_format
+from lib.read_schedule import READ_ORDER_POLICIES
+from lib.run_estimate import (
+    STAGE_COPY,
+    STAGE_HASH,
+    STAGE_SIDECARS,
+    STAGE_UNZIP,
+    RunEstimate,
+    fmt_bytes,
+    fmt_seconds,
+    load_canon_sizes,
+    load_prior_paths,
+    load_throughput,
+    pending_zips,
+    record_throughput,
+    stage_rate,
+    zip_media,
+)
+from lib.run_plan import enumerate_media, hash_occurrences, load_canon_hashes, plan_rows, write_plan
 
 PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
 CANON = require_env("CANON")
@@ -17,39 +34,25 @@ ACCOUNTS = split_env("ACCOUNTS_STR")  # REQUIRED (via env.py)
 PREFERRED_ACCOUNT = require_env("PREFERRED_ACCOUNT")
 RUN_LABEL = optional_env("RUN_LABEL", "run")
 
-TAKEOUT_ROOT = os.path.join(PHOTO_ARCHIVE, "GOOGLE_TAKEOUT")
-
-# Put outputs under a per-run folder to avoid clobbering prior runs
-OUT_DIR = os.path.join(PHOTO_ARCHIVE, "MANIFESTS", RUN_LABEL)
-os.makedirs(OUT_DIR, exist_ok=True)
-
-UNIQUE_CSV = os.path.join(OUT_DIR, "dedup_plan__unique.csv")
-DUP_CSV = os.path.join(OUT_DIR, "dedup_plan__duplicates.csv")
-ALREADY_IN_CANON_CSV = os.path.join(OUT_DIR, "already_in_canon.csv")
-
-MEDIA_EXTS = {
-    ".jpg", ".jpeg", ".png", ".gif", ".heic", ".tif", ".tiff",
-    ".mp4", ".mov", ".m4v", ".avi", ".3gp", ".mpg", ".mpeg", ".webm",
-}
+# Optional: only scan these unzipped ZIP folders (unzipped/<zip-stem>) instead of every staged ZIP
+TAKEOUT_ZIP_STEMS = split_env("TAKEOUT_ZIP_STEMS", default="")
 
-# Canonical filename pattern: <64-hex-sha256><ext>
-RX_CANON = re.compile(r"^(?P<sha>[0-9a-f]{64})(?P<ext>\.[^./\\]+)$", re.IGNORECASE)
+# Validated up front so a bad MANIFEST_FORMAT fails before hours of hashing
+MANIFEST_FORMAT = manifest_format()
 
+# Hashing read scheduling (see lib/read_schedule.py)
+HASH_READ_ORDER = optional_env("HASH_READ_ORDER", "extent").strip().lower()
+HASH_READAHEAD_FILES = int(optional_env("HASH_READAHEAD_FILES", "4"))
+HASH_DROP_CACHE = optional_env("HASH_DROP_CACHE", "1") == "1"
 
-def is_media(p: str) -> bool:
-    return Path(p).suffix.lower() in MEDIA_EXTS
+# Metadata-only estimate of this run's work and time; hashes, copies and writes nothing (see lib/run_estimate.py)
+DRY_RUN = "--dry-run" in sys.argv[1:] or optional_env("PLAN_DRY_RUN", "0") == "1"
 
+TAKEOUT_ROOT = os.path.join(PHOTO_ARCHIVE, "GOOGLE_TAKEOUT")
+MANIFESTS_ROOT = os.path.join(PHOTO_ARCHIVE, "MANIFESTS")
 
-def sha256_file(path: str, chunk_size: int = 8 * 1024 * 1024) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        while True:
-            b = f.read(chunk_size)
-            if not b:
-                break
-            h.update(b)
-    return h.hexdigest()
-
+# Put outputs under a per-run folder to avoid clobbering prior runs
+OUT_DIR = os.path.join(MANIFESTS_ROOT, RUN_LABEL)
 
 if not ACCOUNTS:
     raise SystemExit("ERROR: ACCOUNTS_STR resolved to zero accounts")
@@ -60,18 +63,86 @@ if PREFERRED_ACCOUNT not in ACCOUNTS:
         f"PREFERRED_ACCOUNT={PREFERRED_ACCOUNT!r} ACCOUNTS_STR={ACCOUNTS!r}"
     )
 
-# Load existing canonical hashes from CANON filenames
-canon_hashes: set[str] = set()
-if not os.path.isdir(CANON):
-    raise SystemExit(f"ERROR: CANON directory does not exist: {CANON}")
+if HASH_READ_ORDER not in READ_ORDER_POLICIES:
+    raise SystemExit(
+        f"ERROR: HASH_READ_ORDER must be one of {', '.join(READ_ORDER_POLICIES)} (got {HASH_READ_ORDER!r})"
+    )
+
+
+def dry_run() -> None:
+    started = time.monotonic()
+    candidates, missing = enumerate_media(TAKEOUT_ROOT, ACCOUNTS, TAKEOUT_ZIP_STEMS)
+    # ZIPs still waiting in ZIP_SRC_<account> (run_everything.sh / the ZIP watcher stage them next)
+    src_dirs = {acct: optional_env(f"ZIP_SRC_{acct}", "") for acct in ACCOUNTS}
+    zips = pending_zips(TAKEOUT_ROOT, ACCOUNTS, TAKEOUT_ZIP_STEMS, src_dirs)
+    if not os.path.isdir(CANON):
+        raise SystemExit(f"ERROR: CANON directory does not exist: {CANON}")
+    est = RunEstimate(load_canon_sizes(PHOTO_ARCHIVE, CANON), load_prior_paths(MANIFESTS_ROOT))
+
+    for p in candidates:
+        try:
+            est.add(p, os.stat(p).st_size)
+        except FileNotFoundError:
+            continue
+    staged_files, staged_bytes = est.files, est.bytes
+
+    zip_media_files = 0
+    unzip_bytes = 0
+    for _, zip_path, dest in zips:
+        media, total = zip_media(zip_path, dest)
+        unzip_bytes += total
+        zip_media_files += len(media)
+        for p, size in media:
+            est.add(p, size)
+
+    history = load_throughput(PHOTO_ARCHIVE)
+    stages = [
+        (STAGE_UNZIP, unzip_bytes, "bytes"),
+        (STAGE_HASH, est.bytes, "bytes"),
+        (STAGE_COPY, est.new_unique_bytes, "bytes"),
+        (STAGE_SIDECARS, est.new_unique_files, "files"),
+    ]
+
+    print(f"Run label: {RUN_LABEL} (dry run: nothing is hashed, copied or written)")
+    print(f"Accounts: {', '.join(ACCOUNTS)} (preferred={PREFERRED_ACCOUNT})")
+    if TAKEOUT_ZIP_STEMS:
+        print(f"Scoped to ZIP folders: {', '.join(TAKEOUT_ZIP_STEMS)}")
+    # An account whose ZIPs are still pending is expected to have nothing unzipped yet
+    zip_accounts = {acct for acct, _, _ in zips}
+    for d in missing:
+        if os.path.relpath(d, TAKEOUT_ROOT).split(os.sep)[0] not in zip_accounts:
+            print(f"WARNING: not unzipped yet: {d}")
+    print(f"Staged takeout media files: {staged_files:,} ({fmt_bytes(staged_bytes)})")
+    print(f"Unstaged ZIPs: {len(zips):,} ({zip_media_files:,} media entries, {fmt_bytes(unzip_bytes)} to unzip)")
+    print(f"Probably known (same path and size in a prior run): {est.known[0]:,} ({fmt_bytes(est.known[1])})")
+    print(f"Probably known (size matches a canonical): {est.size_match[0]:,} ({fmt_bytes(est.size_match[1])})")
+    print(f"New (no canonical of that size): {est.new[0]:,} ({fmt_bytes(est.new[1])}), ~{est.new_unique_files:,} unique")
+
+    total: float = 0.0
+    unknown = []
+    print("Predicted stages:")
+    for stage, amount, unit in stages:
+        rate = stage_rate(history, stage, unit)
+        seconds = 0.0 if not amount else (amount / rate if rate else None)
+        work = fmt_bytes(amount) if unit == "bytes" else f"{amount:,} {unit}"
+        speed = "" if not rate else f" at {fmt_bytes(rate)}/s" if unit == "bytes" else f" at {rate:,.0f} {unit}/s"
+        print(f"  {stage}: {work}, {fmt_seconds(seconds)}{speed}")
+        if seconds is None:
+            unknown.append(stage)
+        else:
+            total += seconds
+    suffix = f" (excluding {', '.join(unknown)})" if unknown else ""
+    print(f"Predicted total: {fmt_seconds(total)}{suffix}")
+    print(f"Estimate took: {time.monotonic() - started:,.1f}s")
+
+
+if DRY_RUN:
+    dry_run()
+    sys.exit(0)
+
+os.makedirs(OUT_DIR, exist_ok=True)
 
-for fn in os.listdir(CANON):
-    if should_skip_filename(fn) or is_shafferography_sidecar(fn):
-        continue
-    m = RX_CANON.match(fn)
-    if not m:
-        continue
-    canon_hashes.add(m.group("sha").lower())
+canon_hashes = load_canon_hashes(CANON)
 
 # sha256 -> list of occurrences (ONLY those not already in CANON)
 records_by_sha: dict[str, list[dict]] = defaultdict(list)
@@ -80,150 +151,48 @@ records_by_sha: dict[str, list[dict]] = defaultdict(list)
 already_by_sha: dict[str, list[dict]] = defaultdict(list)
 
 scanned_media_files = 0
+hashed_bytes = 0
 skipped_already_in_canon = 0
-missing_unzipped: list[str] = []
-
-for acct in ACCOUNTS:
-    base = os.path.join(TAKEOUT_ROOT, acct, "unzipped")
-    if not os.path.isdir(base):
-        missing_unzipped.append(base)
-        continue
-
-    for dirpath, _, filenames in os.walk(base):
-        for fn in filenames:
-            if should_skip_filename(fn):
-                continue
-
-            p = os.path.join(dirpath, fn)
-            if not is_media(p):
-                continue
-
-            scanned_media_files += 1
-            sha = sha256_file(p).lower()
-            rel = os.path.relpath(p, base)
-
-            rec = {
-                "account": acct,
-                "takeoutRoot": base,
-                "relativePath": rel,
-                "absPath": p,
-                "ext": Path(fn).suffix.lower(),
-            }
-
-            if sha in canon_hashes:
-                already_by_sha[sha].append(rec)
-                skipped_already_in_canon += 1
-            else:
-                records_by_sha[sha].append(rec)
+
+# Enumerate first so the hashing stage can read files in physical-locality order
+candidates, missing_unzipped = enumerate_media(TAKEOUT_ROOT, ACCOUNTS, TAKEOUT_ZIP_STEMS)
 
 if missing_unzipped:
     msg = "ERROR: missing expected unzipped takeout directories:\n" + "\n".join(missing_unzipped)
     raise SystemExit(msg)
 
+hash_started = time.monotonic()
+
+for sha, rec in hash_occurrences(candidates, HASH_READ_ORDER, HASH_READAHEAD_FILES, HASH_DROP_CACHE):
+    scanned_media_files += 1
+    hashed_bytes += os.path.getsize(rec["absPath"])
+    if sha in canon_hashes:
+        already_by_sha[sha].append(rec)
+        skipped_already_in_canon += 1
+    else:
+        records_by_sha[sha].append(rec)
+
+hash_seconds = time.monotonic() - hash_started
+record_throughput(PHOTO_ARCHIVE, STAGE_HASH, RUN_LABEL, scanned_media_files, hashed_bytes, hash_seconds)
+
 print(f"Run label: {RUN_LABEL}")
 print(f"Accounts: {', '.join(ACCOUNTS)} (preferred={PREFERRED_ACCOUNT})")
+if TAKEOUT_ZIP_STEMS:
+    print(f"Scoped to ZIP folders: {', '.join(TAKEOUT_ZIP_STEMS)}")
 print(f"Existing canon hashes detected: {len(canon_hashes):,}")
 print(f"Scanned takeout media files: {scanned_media_files:,}")
+print(f"Hash read order: {HASH_READ_ORDER} (readahead={HASH_READAHEAD_FILES}, drop_cache={HASH_DROP_CACHE}); {hash_seconds:,.1f}s")
 print(f"Takeout items already in CANON (skipped from plan): {skipped_already_in_canon:,}")
 print(f"New-to-CANON unique hashes found: {len(records_by_sha):,}")
 
-# Build manifests for NEW items only
-unique_rows: list[dict] = []
-dup_rows: list[dict] = []
-
-for sha, recs in records_by_sha.items():
-    recs_sorted = sorted(
-        recs,
-        key=lambda r: (
-            0 if r["account"] == PREFERRED_ACCOUNT else 1,
-            r["account"],
-            r["relativePath"],
-        ),
-    )
-    canonical = recs_sorted[0]
-
-    unique_rows.append(
-        {
-            "sha256": sha,
-            "ext": canonical["ext"],
-            "account": canonical["account"],
-            "relativePath": canonical["relativePath"],
-            "absPath": canonical["absPath"],
-            "runLabel": RUN_LABEL,
-            "preferredAccount": PREFERRED_ACCOUNT,
-            "occurrences": str(len(recs)),
-        }
-    )
+# Build manifests for NEW items only (plus the already-in-canon audit report)
+unique_rows, dup_rows, already_rows = plan_rows(records_by_sha, already_by_sha, PREFERRED_ACCOUNT, RUN_LABEL)
+unique_out, dup_out, already_out = write_plan(OUT_DIR, unique_rows, dup_rows, already_rows)
+
+print(f"Wrote: {unique_out} ({len(unique_rows):,} rows)")
+print(f"Wrote: {dup_out} ({len(dup_rows):,} rows)")
+print(f"Wrote: {already_out} ({len(already_rows):,} rows)")
 
-    for r in recs_sorted[1:]:
-        dup_rows.append(
-            {
-                "sha256": sha,
-                "ext": r["ext"],
-                "account": r["account"],
-                "relativePath": r["relativePath"],
-                "absPath": r["absPath"],
-                "runLabel": RUN_LABEL,
-                "preferredAccount": PREFERRED_ACCOUNT,
-            }
-        )
-
-unique_rows.sort(key=lambda r: r["sha256"])
-dup_rows.sort(key=lambda r: (r["sha256"], r["account"], r["relativePath"]))
-
-unique_fields = [
-    "sha256",
-    "ext",
-    "account",
-    "relativePath",
-    "absPath",
-    "runLabel",
-    "preferredAccount",
-    "occurrences",
-]
-dup_fields = [
-    "sha256",
-    "ext",
-    "account",
-    "relativePath",
-    "absPath",
-    "runLabel",
-    "preferredAccount",
-]
-
-with open(UNIQUE_CSV, "w", newline="", encoding="utf-8") as f:
-    w = csv.DictWriter(f, fieldnames=unique_fields)
-    w.writeheader()
-    w.writerows(unique_rows)
-
-with open(DUP_CSV, "w", newline="", encoding="utf-8") as f:
-    w = csv.DictWriter(f, fieldnames=dup_fields)
-    w.writeheader()
-    w.writerows(dup_rows)
-
-# Write “already in canon” report (for audit/debug)
-already_rows: list[dict] = []
-for sha, recs in already_by_sha.items():
-    for r in sorted(recs, key=lambda x: (x["account"], x["relativePath"])):
-        already_rows.append(
-            {
-                "sha256": sha,
-                "ext": r["ext"],
-                "account": r["account"],
-                "relativePath": r["relativePath"],
-                "absPath": r["absPath"],
-                "runLabel": RUN_LABEL,
-            }
-        )
-
-already_fields = ["sha256", "ext", "account", "relativePath", "absPath", "runLabel"]
-already_rows.sort(key=lambda r: (r["sha256"], r["account"], r["relativePath"]))
-
-with open(ALREADY_IN_CANON_CSV, "w", newline="", encoding="utf-8") as f:
-    w = csv.DictWriter(f, fieldnames=already_fields)
-    w.writeheader()
-    w.writerows(already_rows)
-
-print(f"Wrote: {UNIQUE_CSV} ({len(unique_rows):,} rows)")
-print(f"Wrote: {DUP_CSV} ({len(dup_rows):,} rows)")
-print(f"Wrote: {ALREADY_IN_CANON_CSV} ({len(already_rows):,} rows)")
+# Album membership comes free with enumeration (see lib/albums.py)
+album_rows = membership_rows(records_by_sha, already_by_sha)
+print(f"Wrote: {write_album_membership(OUT_DIR, album_rows)} ({len(album_rows):,} rows)")
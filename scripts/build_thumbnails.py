@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import time
+
+from lib.env import require_env, optional_env, split_env
+from lib.fs_filters import is_shafferography_sidecar, should_skip_filename
+from lib.run_plan import RX_CANON, is_media
+from lib.takeout_sidecar import ChunkPool
+from lib.thumbs import (
+    HEIF_EXTS,
+    THUMB_FORMATS,
+    VIDEO_EXTS,
+    has_ffmpeg,
+    has_heif,
+    missing_sizes,
+    render_chunk,
+    require_pillow,
+)
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+CANON = require_env("CANON")
+
+# Longest-edge sizes to render per canonical, and the on-disk format
+THUMB_SIZES = sorted({int(s) for s in split_env("THUMB_SIZES", default="256 1024")})
+THUMB_FORMAT = optional_env("THUMB_FORMAT", "webp").strip().lower()
+THUMB_QUALITY = int(optional_env("THUMB_QUALITY", "80"))
+THUMB_ROOT = optional_env("THUMB_ROOT", os.path.join(PHOTO_ARCHIVE, "DERIVED", "thumbs"))
+
+# Worker processes (1 = serial, in-process) and canonicals per task
+THUMB_WORKERS = int(optional_env("THUMB_WORKERS", str(os.cpu_count() or 1)))
+THUMB_CHUNK_SIZE = int(optional_env("THUMB_CHUNK_SIZE", "16"))
+
+if THUMB_FORMAT not in THUMB_FORMATS:
+    raise SystemExit(f"ERROR: THUMB_FORMAT must be one of {', '.join(THUMB_FORMATS)} (got {THUMB_FORMAT!r})")
+
+if not THUMB_SIZES or min(THUMB_SIZES) <= 0:
+    raise SystemExit(f"ERROR: THUMB_SIZES must be positive integers (got {THUMB_SIZES!r})")
+
+if not os.path.isdir(CANON):
+    raise SystemExit(f"ERROR: CANON directory does not exist: {CANON}")
+
+
+def main() -> None:
+    require_pillow()
+    ffmpeg = has_ffmpeg()
+    heif = has_heif()
+
+    scanned = 0
+    up_to_date = 0
+    skipped_video = 0
+    skipped_heif = 0
+    tasks: list[tuple[str, str, str, list[int]]] = []
+
+    for fn in sorted(os.listdir(CANON)):
+        if should_skip_filename(fn) or is_shafferography_sidecar(fn):
+            continue
+        m = RX_CANON.match(fn)
+        if not m or not is_media(fn):
+            continue
+        scanned += 1
+
+        sha = m.group("sha").lower()
+        ext = m.group("ext").lower()
+        todo = missing_sizes(THUMB_ROOT, sha, THUMB_SIZES, THUMB_FORMAT)
+        if not todo:
+            up_to_date += 1
+            continue
+        if ext in VIDEO_EXTS and not ffmpeg:
+            skipped_video += 1
+            continue
+        if ext in HEIF_EXTS and not heif:
+            skipped_heif += 1
+            continue
+        tasks.append((sha, ext, os.path.join(CANON, fn), todo))
+
+    chunk_args = (THUMB_ROOT, THUMB_FORMAT, THUMB_QUALITY)
+    workers = max(1, min(THUMB_WORKERS, len(tasks)))
+    started = time.monotonic()
+    pool = ChunkPool(render_chunk, chunk_args, workers, lambda task, err: (task[0], 0, 0, err))
+    results = pool.map(tasks, THUMB_CHUNK_SIZE)
+    elapsed = time.monotonic() - started
+
+    rendered = 0
+    src_bytes = 0
+    thumb_bytes = 0
+    failures: list[tuple[str, str]] = []
+    for sha, n_src, n_thumb, error in sorted(results, key=lambda r: r[0]):
+        if error is not None:
+            failures.append((sha, error))
+            continue
+        rendered += 1
+        src_bytes += n_src
+        thumb_bytes += n_thumb
+
+    rate = rendered / elapsed if elapsed > 0 else 0
+    mb_s = src_bytes / 1e6 / elapsed if elapsed > 0 else 0
+
+    print(f"Thumbnail root: {THUMB_ROOT}")
+    print(f"Sizes: {', '.join(str(s) for s in THUMB_SIZES)} ({THUMB_FORMAT}, quality={THUMB_QUALITY})")
+    print(f"Canonical media scanned: {scanned:,}")
+    print(f"Already cached (all sizes present): {up_to_date:,}")
+    print(f"Thumbnail workers: {workers} ({elapsed:,.1f}s, {rate:,.1f} canonicals/s, {mb_s:,.1f} MB/s source read)")
+    print(f"Canonicals rendered: {rendered:,} ({thumb_bytes / 1e6:,.1f} MB of thumbnails)")
+    if skipped_video:
+        print(f"Skipped videos (ffmpeg not on PATH): {skipped_video:,}")
+    if skipped_heif:
+        print(f"Skipped HEIC/HEIF (pillow-heif not installed): {skipped_heif:,}")
+
+    if failures:
+        print(f"ERROR: thumbnail generation failed for {len(failures):,} canonicals:")
+        for sha, error in failures[:10]:
+            print(f" - {sha}: {error}")
+        if len(failures) > 10:
+            print(" - ...")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
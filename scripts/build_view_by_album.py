@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from lib.albums import ALBUM_MEMBERSHIP_CSV_NAME, AlbumIndex, album_dir_name
+from lib.env import require_env, optional_env
+from lib.fs_filters import is_shafferography_sidecar, should_skip_filename
+from lib.manifests import iter_manifest, resolve_manifest
+from lib.run_plan import RX_CANON
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+CANON = require_env("CANON")
+
+MANIFESTS_ROOT = os.path.join(PHOTO_ARCHIVE, "MANIFESTS")
+ALBUM_INDEX_ROOT = optional_env("ALBUM_INDEX_ROOT", os.path.join(MANIFESTS_ROOT, "album_index"))
+VIEW_ROOT = os.path.join(PHOTO_ARCHIVE, "VIEWS", "by-album")
+
+# Forget which runs were folded in and rebuild the index (and view) from every run's membership manifest
+ALBUM_REBUILD = optional_env("ALBUM_REBUILD", "0") == "1"
+
+if not os.path.isdir(CANON):
+    raise SystemExit(f"ERROR: CANON directory does not exist: {CANON}")
+
+index = AlbumIndex(ALBUM_INDEX_ROOT)
+if ALBUM_REBUILD:
+    index.clear()
+
+# Fold in every run whose membership manifest has not been indexed yet (run manifests never change)
+new_runs: list[str] = []
+added: list[dict] = []
+for name in sorted(os.listdir(MANIFESTS_ROOT)):
+    run_dir = os.path.join(MANIFESTS_ROOT, name)
+    if name in index.runs or not os.path.isdir(run_dir):
+        continue
+    path = resolve_manifest(os.path.join(run_dir, ALBUM_MEMBERSHIP_CSV_NAME))
+    if path is None:
+        continue
+    added.extend(index.add_run(name, iter_manifest(path, required=("albumTitle", "sha256", "account", "relativePath"))))
+    new_runs.append(name)
+
+if new_runs:
+    index.write()
+
+# Canonical filename per sha (the occurrence's ext may differ from the canonical's)
+canon_by_sha: dict[str, str] = {}
+for fn in os.listdir(CANON):
+    if should_skip_filename(fn) or is_shafferography_sidecar(fn):
+        continue
+    m = RX_CANON.match(fn)
+    if m:
+        canon_by_sha[m.group("sha").lower()] = fn
+
+# A missing view (deleted, or never built) is regenerated from the whole index; otherwise only new rows are linked
+full_view = ALBUM_REBUILD or not os.path.isdir(VIEW_ROOT)
+to_link = index.pair_rows() if full_view else added
+
+created = 0
+missing_canon = 0
+for row in to_link:
+    sha = row["sha256"]
+    canon_fn = canon_by_sha.get(sha)
+    if canon_fn is None:
+        missing_canon += 1
+        continue
+    dest_dir = os.path.join(VIEW_ROOT, album_dir_name(row["albumTitle"]))
+    os.makedirs(dest_dir, exist_ok=True)
+    stem = Path(row["fileName"]).stem or "media"
+    dest = os.path.join(dest_dir, f"{stem}_{sha[:10]}{Path(canon_fn).suffix}")
+    if not os.path.lexists(dest):
+        os.symlink(os.path.relpath(os.path.join(CANON, canon_fn), dest_dir), dest)
+        created += 1
+
+albums = index.albums()
+print(f"Album index: {ALBUM_INDEX_ROOT}")
+print(f"Runs folded in this time: {len(new_runs):,} (total {len(index.runs):,})")
+print(f"New album/sha pairs: {len(added):,}")
+print(f"Albums: {len(albums):,} ({sum(albums.values()):,} album/sha pairs)")
+print(f"View: {VIEW_ROOT} ({'full rebuild' if full_view else 'incremental'})")
+print(f"Created symlinks: {created:,}")
+if missing_canon:
+    print(f"Skipped (canonical not materialized): {missing_canon:,}")
+print("Done.")
@@ -3,22 +3,48 @@ from __future__ import annotations
 
 import os
 import re
+import shutil
 import subprocess
+from collections import Counter
 
-from lib.env import require_env
+from lib.capture_date import capture_date
+from lib.env import require_env, optional_env
 from lib.fs_filters import is_shafferography_sidecar, should_skip_filename
 
 PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
 CANON = require_env("CANON")
 VIEW_ROOT = os.path.join(PHOTO_ARCHIVE, "VIEWS", "by-date")
 
+# Dates are read natively from JPEG/TIFF/HEIF/MOV/MP4 headers (lib/capture_date.py); exiftool is the fallback
+# unsupported = only for formats the native reader cannot parse (default)
+# missing     = also for parsed files that carry no date (e.g. XMP-only dates)
+DATE_EXIFTOOL_FALLBACK = optional_env("DATE_EXIFTOOL_FALLBACK", "unsupported").strip().lower()
+
+if DATE_EXIFTOOL_FALLBACK not in ("unsupported", "missing"):
+    raise SystemExit(f"ERROR: DATE_EXIFTOOL_FALLBACK must be unsupported or missing (got {DATE_EXIFTOOL_FALLBACK!r})")
+
+EXIFTOOL = shutil.which("exiftool")
+
 os.makedirs(VIEW_ROOT, exist_ok=True)
 
 rx = re.compile(r"^(\d{4}):(\d{2}):(\d{2})\b")
 
+
+def exiftool_date(path: str) -> str | None:
+    cmd = [EXIFTOOL, "-DateTimeOriginal", "-CreateDate", "-s", "-s", "-s", path]
+    p = subprocess.run(cmd, capture_output=True, text=True)
+    for ln in p.stdout.splitlines():
+        if rx.match(ln.strip()):
+            return ln.strip()
+    return None
+
+
 created = 0
 no_exif = 0
 skipped = 0
+native = Counter()
+exiftool_calls = 0
+no_reader = 0
 
 for fn in os.listdir(CANON):
     if should_skip_filename(fn) or is_shafferography_sidecar(fn):
@@ -29,16 +55,18 @@ for fn in os.listdir(CANON):
     if not os.path.isfile(src):
         continue
 
-    cmd = ["exiftool", "-DateTimeOriginal", "-CreateDate", "-s", "-s", "-s", src]
-    p = subprocess.run(cmd, capture_output=True, text=True)
-    lines = [ln.strip() for ln in p.stdout.splitlines() if ln.strip()]
+    container, stamp = capture_date(src)
+    if container is not None:
+        native[container] += 1
+    if container is None or (stamp is None and DATE_EXIFTOOL_FALLBACK == "missing"):
+        if EXIFTOOL:
+            stamp = exiftool_date(src)
+            exiftool_calls += 1
+        elif container is None:
+            no_reader += 1
 
-    ymd = None
-    for ln in lines:
-        m = rx.match(ln)
-        if m:
-            ymd = f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
-            break
+    m = rx.match(stamp) if stamp else None
+    ymd = f"{m.group(1)}-{m.group(2)}-{m.group(3)}" if m else None
 
     if ymd:
         yyyy, mm, _ = ymd.split("-")
@@ -60,4 +88,8 @@ for fn in os.listdir(CANON):
 print(f"Created {created:,} symlinks")
 print(f"Placed {no_exif:,} files under NO_EXIF/ (fallback used)")
 print(f"Skipped {skipped:,} non-media artifacts")
+print(f"Read natively: {sum(native.values()):,} ({', '.join(f'{k} {v:,}' for k, v in sorted(native.items())) or 'none'})")
+print(f"exiftool fallbacks: {exiftool_calls:,}")
+if no_reader:
+    print(f"WARNING: exiftool not found; {no_reader:,} files in other formats went to NO_EXIF/")
 print("Done.")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import os
+
+from lib.env import require_env, optional_env
+from lib.fs_filters import should_skip_filename
+from lib.geo_index import GEOHASH_PRECISION, GeoIndex, geohash_encode, sidecar_latlon
+from lib.run_plan import RX_CANON
+from lib.sidecar_store import SidecarStore
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+CANON = require_env("CANON")
+
+GEO_INDEX_ROOT = optional_env("GEO_INDEX_ROOT", os.path.join(PHOTO_ARCHIVE, "MANIFESTS", "geo_index"))
+SIDECAR_PACK_ROOT = optional_env(
+    "SIDECAR_PACK_ROOT", os.path.join(PHOTO_ARCHIVE, "CANONICAL", "sidecar-packs")
+)
+VIEW_ROOT = os.path.join(PHOTO_ARCHIVE, "VIEWS", "by-place")
+
+# View folders: VIEWS/by-place/<geohash[:3]>/<geohash[:GEO_VIEW_PRECISION]>/ (5 = ~5 km cells)
+GEO_VIEW_PRECISION = int(optional_env("GEO_VIEW_PRECISION", "5"))
+# Forget what was indexed and re-read every sidecar (regenerated sidecars are re-read anyway)
+GEO_REBUILD = optional_env("GEO_REBUILD", "0") == "1"
+
+SIDECAR_SUFFIX = ".shafferography.json"
+
+if not 3 <= GEO_VIEW_PRECISION <= GEOHASH_PRECISION:
+    raise SystemExit(f"ERROR: GEO_VIEW_PRECISION must be between 3 and {GEOHASH_PRECISION} (got {GEO_VIEW_PRECISION})")
+
+if not os.path.isdir(CANON):
+    raise SystemExit(f"ERROR: CANON directory does not exist: {CANON}")
+
+index = GeoIndex(GEO_INDEX_ROOT)
+if GEO_REBUILD:
+    index.reset()
+seen = index.seen()
+
+# Per-file sidecars first; the packed store fills in shas that only exist there.
+# A sidecar is re-read when its stamp (file mtime + size, or pack commit) differs from seen.txt.
+examined: dict[str, str] = {}
+file_shas: set[str] = set()
+points: list[tuple[str, str, float, float]] = []
+unreadable = 0
+
+for fn in sorted(os.listdir(CANON)):
+    if should_skip_filename(fn) or not fn.endswith(SIDECAR_SUFFIX):
+        continue
+    m = RX_CANON.match(fn[: -len(SIDECAR_SUFFIX)])
+    if not m:
+        continue
+    sha = m.group("sha").lower()
+    file_shas.add(sha)
+    path = os.path.join(CANON, fn)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        continue
+    stamp = f"{st.st_mtime_ns}-{st.st_size}"
+    if seen.get(sha) == stamp:
+        continue
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+    except Exception:
+        unreadable += 1
+        file_shas.discard(sha)  # let a packed copy stand in
+        continue
+    examined[sha] = stamp
+    ll = sidecar_latlon(sidecar)
+    if ll is not None:
+        points.append((sha, m.group("ext").lower(), ll[0], ll[1]))
+
+store = SidecarStore(SIDECAR_PACK_ROOT)
+for sha in store.shas():
+    stamp = store.stamp(sha)
+    if sha in file_shas or seen.get(sha) == stamp:
+        continue
+    sidecar = store.get(sha)
+    if sidecar is None:
+        continue
+    examined[sha] = stamp
+    ll = sidecar_latlon(sidecar)
+    if ll is not None:
+        points.append((sha, (store.ext(sha) or "").lower(), ll[0], ll[1]))
+
+# Changed sidecars of already indexed shas: their existing links may sit in the wrong cell now
+restamped = {sha for sha in examined if sha in seen}
+old_links = [(sha, ext, gh) for gh, _, _, sha, ext in index.iter_rows() if sha in restamped] if restamped else []
+
+total_rows = index.add(examined, points) if examined else sum(1 for _ in index.iter_rows())
+
+# A missing view (deleted, or never built) is regenerated from the whole table; otherwise only new points are linked
+full_view = GEO_REBUILD or not os.path.isdir(VIEW_ROOT)
+if full_view:
+    to_link = [(sha, ext, gh) for gh, _, _, sha, ext in index.iter_rows()]
+else:
+    to_link = [(sha, ext, geohash_encode(lat, lon)) for sha, ext, lat, lon in points]
+
+def link_path(sha: str, ext: str, gh: str) -> tuple[str, str]:
+    cell = gh[:GEO_VIEW_PRECISION]
+    dest_dir = os.path.join(VIEW_ROOT, cell[:3], cell)
+    return dest_dir, os.path.join(dest_dir, f"{cell}_{sha[:10]}{ext}")
+
+
+removed = 0
+for sha, ext, gh in old_links:
+    _, dest = link_path(sha, ext, gh)
+    if os.path.islink(dest):
+        os.remove(dest)
+        removed += 1
+
+created = 0
+missing_canon = 0
+for sha, ext, gh in to_link:
+    src = os.path.join(CANON, f"{sha}{ext}")
+    if not os.path.isfile(src):
+        missing_canon += 1
+        continue
+    dest_dir, dest = link_path(sha, ext, gh)
+    os.makedirs(dest_dir, exist_ok=True)
+    if not os.path.lexists(dest):
+        os.symlink(os.path.relpath(src, dest_dir), dest)
+        created += 1
+
+print(f"Geo index: {GEO_INDEX_ROOT}")
+print(f"Sidecars examined this run: {len(examined):,} (already indexed: {len(seen):,})")
+print(f"New located canonicals: {len(points):,} (no usable geoData: {len(examined) - len(points):,})")
+if unreadable:
+    print(f"Unreadable sidecars skipped: {unreadable:,}")
+print(f"Indexed points total: {total_rows:,}")
+print(f"View: {VIEW_ROOT} ({'full rebuild' if full_view else 'incremental'})")
+print(f"Created symlinks: {created:,}")
+if removed:
+    print(f"Removed symlinks of changed sidecars: {removed:,}")
+if missing_canon:
+    print(f"Skipped (missing canonical media): {missing_canon:,}")
+print("Done.")
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import csv
 import os
 import re
 from datetime import datetime
 
 from lib.env import require_env
 from lib.fs_filters import is_shafferography_sidecar, should_skip_filename
+from lib.manifests import write_manifest
 
 PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
 CANON = require_env("CANON")
@@ -55,15 +55,13 @@ for fn in os.listdir(CANON):
 rows.sort(key=lambda r: r["sha256"])
 os.makedirs(os.path.dirname(OUT), exist_ok=True)
 
-with open(OUT, "w", newline="", encoding="utf-8") as f:
-    w = csv.DictWriter(
-        f,
-        fieldnames=["generatedAtUtc", "sha256", "ext", "bytes", "mtimeEpochSec", "fileName"],
-    )
-    w.writeheader()
-    w.writerows(rows)
+out_path = write_manifest(
+    OUT,
+    ["generatedAtUtc", "sha256", "ext", "bytes", "mtimeEpochSec", "fileName"],
+    rows,
+)
 
-print(f"Wrote {len(rows):,} rows -> {OUT}")
+print(f"Wrote {len(rows):,} rows -> {out_path}")
 print("Inventory mode: media-only (excluding .shafferography.json sidecars)")
 print(f"Skipped {skipped_artifacts:,} macOS artifacts")
 print(f"Skipped {skipped_sidecars:,} sidecars")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+
+from lib.env import require_env, optional_env
+from lib.manifests import iter_manifest, manifest_fields, write_manifest
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+RUN_LABEL = optional_env("RUN_LABEL", "run")
+
+MANIFESTS_ROOT = os.path.join(PHOTO_ARCHIVE, "MANIFESTS")
+
+# Export every run folder (plus top-level manifests), not just RUN_LABEL
+EXPORT_ALL_RUNS = optional_env("EXPORT_ALL_RUNS", "0") == "1"
+# Write plain CSVs here (mirroring MANIFESTS/); when unset, compressed manifests are converted in place
+MANIFEST_EXPORT_DIR = optional_env("MANIFEST_EXPORT_DIR", "")
+
+COMPRESSED_SUFFIXES = (".csv.gz", ".csv.zst")
+
+
+def compressed_manifests(d: str) -> list[str]:
+    if not os.path.isdir(d):
+        return []
+    return sorted(os.path.join(d, fn) for fn in os.listdir(d) if fn.endswith(COMPRESSED_SUFFIXES))
+
+
+dirs = [os.path.join(MANIFESTS_ROOT, RUN_LABEL)]
+if EXPORT_ALL_RUNS:
+    dirs = [MANIFESTS_ROOT] + sorted(
+        os.path.join(MANIFESTS_ROOT, name)
+        for name in os.listdir(MANIFESTS_ROOT)
+        if os.path.isdir(os.path.join(MANIFESTS_ROOT, name))
+    )
+
+exported = 0
+for d in dirs:
+    for src in compressed_manifests(d):
+        logical = src[: src.rindex(".csv") + len(".csv")]
+        if MANIFEST_EXPORT_DIR:
+            logical = os.path.join(MANIFEST_EXPORT_DIR, os.path.relpath(logical, MANIFESTS_ROOT))
+            os.makedirs(os.path.dirname(logical), exist_ok=True)
+        rows = list(iter_manifest(src))
+        out = write_manifest(logical, manifest_fields(src), rows, fmt="csv")
+        print(f"Exported: {src} -> {out} ({len(rows):,} rows)")
+        exported += 1
+
+print(f"Manifests exported to plain CSV: {exported:,}")
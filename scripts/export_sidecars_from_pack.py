@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+
+from lib.env import require_env, optional_env, split_env
+from lib.sidecar_store import SidecarStore, write_sidecar_file
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+CANON = require_env("CANON")
+SIDECAR_PACK_ROOT = optional_env(
+    "SIDECAR_PACK_ROOT", os.path.join(PHOTO_ARCHIVE, "CANONICAL", "sidecar-packs")
+)
+
+# Optional: limit the export to these shas (whitespace-delimited). Default: every sha in the store.
+EXPORT_SHAS = {s.lower() for s in split_env("EXPORT_SHAS", default="")}
+# Existing per-file sidecars are left alone unless EXPORT_OVERWRITE=1
+EXPORT_OVERWRITE = optional_env("EXPORT_OVERWRITE", "0") == "1"
+
+if not os.path.isdir(CANON):
+    raise SystemExit(f"ERROR: CANON directory does not exist: {CANON}")
+
+store = SidecarStore(SIDECAR_PACK_ROOT)
+if not store.packs:
+    raise SystemExit(f"ERROR: no sidecar packs found under: {SIDECAR_PACK_ROOT}")
+
+written = 0
+skipped_existing = 0
+skipped_missing_media = 0
+
+for sha, ext, sidecar in store.iter_sidecars():
+    if EXPORT_SHAS and sha not in EXPORT_SHAS:
+        continue
+
+    if not os.path.isfile(os.path.join(CANON, f"{sha}{ext}")):
+        skipped_missing_media += 1
+        continue
+
+    out_path = os.path.join(CANON, f"{sha}{ext}.shafferography.json")
+    if os.path.exists(out_path) and not EXPORT_OVERWRITE:
+        skipped_existing += 1
+        continue
+
+    write_sidecar_file(out_path, sidecar)
+    written += 1
+
+missing_requested = len(EXPORT_SHAS - set(store.shas())) if EXPORT_SHAS else 0
+
+print(f"Sidecar packs read: {len(store.packs):,} ({len(store):,} shas)")
+print(f"Sidecars exported: {written:,}")
+print(f"Skipped (sidecar already present): {skipped_existing:,}")
+print(f"Skipped (missing canonical media): {skipped_missing_media:,}")
+if EXPORT_SHAS:
+    print(f"Requested shas not in store: {missing_requested:,}")
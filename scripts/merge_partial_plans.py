@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import os
+from collections import defaultdict
+
+from lib.albums import membership_rows, write_album_membership
+from lib.env import require_env, optional_env, split_env
+from lib.manifests import iter_manifest, manifest_format, resolve_manifest
+from lib.run_plan import (
+    OCCURRENCE_REQUIRED_FIELDS,
+    PARTIALS_DIR_NAME,
+    load_canon_hashes,
+    parse_shard,
+    plan_rows,
+    write_plan,
+)
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+CANON = require_env("CANON")
+ACCOUNTS = split_env("ACCOUNTS_STR")  # REQUIRED (via env.py)
+PREFERRED_ACCOUNT = require_env("PREFERRED_ACCOUNT")
+RUN_LABEL = optional_env("RUN_LABEL", "run")
+
+OUT_DIR = os.path.join(PHOTO_ARCHIVE, "MANIFESTS", RUN_LABEL)
+PARTIALS_DIR = optional_env("PARTIALS_DIR", os.path.join(OUT_DIR, PARTIALS_DIR_NAME))
+
+# Rebuild absPath from this machine's GOOGLE_TAKEOUT (partials hashed on other machines/mounts)
+MERGE_REBASE_PATHS = optional_env("MERGE_REBASE_PATHS", "0") == "1"
+
+MANIFEST_FORMAT = manifest_format()
+
+TAKEOUT_ROOT = os.path.join(PHOTO_ARCHIVE, "GOOGLE_TAKEOUT")
+
+OCC_SUFFIX = ".occurrences.csv"
+
+if not ACCOUNTS:
+    raise SystemExit("ERROR: ACCOUNTS_STR resolved to zero accounts")
+
+if PREFERRED_ACCOUNT not in ACCOUNTS:
+    raise SystemExit(
+        "ERROR: PREFERRED_ACCOUNT must be one of ACCOUNTS_STR. "
+        f"PREFERRED_ACCOUNT={PREFERRED_ACCOUNT!r} ACCOUNTS_STR={ACCOUNTS!r}"
+    )
+
+if not os.path.isdir(PARTIALS_DIR):
+    raise SystemExit(f"ERROR: partials directory does not exist: {PARTIALS_DIR}")
+
+
+def load_meta(partial_id: str) -> dict:
+    path = os.path.join(PARTIALS_DIR, f"{partial_id}.meta.json")
+    if not os.path.isfile(path):
+        raise SystemExit(f"ERROR: partial {partial_id!r} has no meta file: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+partial_ids = sorted(
+    {fn[: fn.index(OCC_SUFFIX)] for fn in os.listdir(PARTIALS_DIR) if OCC_SUFFIX in fn and not fn.endswith(".tmp")}
+)
+if not partial_ids:
+    raise SystemExit(f"ERROR: no partial plans found in {PARTIALS_DIR}")
+
+metas = {pid: load_meta(pid) for pid in partial_ids}
+
+# Every (account, zip-scope) group must have a complete i/n shard set, and every account a partial
+shard_sets: dict[tuple[str, tuple[str, ...]], dict[int, set[int]]] = defaultdict(lambda: defaultdict(set))
+for pid, meta in metas.items():
+    if meta["account"] not in ACCOUNTS:
+        raise SystemExit(f"ERROR: partial {pid!r} is for account {meta['account']!r}, not in ACCOUNTS_STR={ACCOUNTS!r}")
+    i, n = parse_shard(meta["shard"])
+    group = shard_sets[(meta["account"], tuple(meta.get("zipStems") or ()))]
+    if i in group[n]:
+        raise SystemExit(f"ERROR: shard {i}/{n} of account {meta['account']!r} appears in more than one partial")
+    group[n].add(i)
+
+problems: list[str] = []
+for (acct, stems), by_count in sorted(shard_sets.items()):
+    scope = f"{acct} [{', '.join(stems)}]" if stems else acct
+    if len(by_count) > 1:
+        problems.append(f"{scope}: mixed shard counts {sorted(by_count)}")
+        continue
+    for n, seen in by_count.items():
+        missing = sorted(set(range(n)) - seen)
+        if missing:
+            problems.append(f"{scope}: missing shards {', '.join(f'{i}/{n}' for i in missing)}")
+
+covered_accounts = {acct for acct, _ in shard_sets}
+for acct in ACCOUNTS:
+    if acct not in covered_accounts:
+        problems.append(f"{acct}: no partial plan")
+
+if problems:
+    raise SystemExit("ERROR: incomplete partial plan set:\n" + "\n".join(problems))
+
+canon_hashes = load_canon_hashes(CANON)
+
+# sha256 -> list of occurrences (ONLY those not already in CANON)
+records_by_sha: dict[str, list[dict]] = defaultdict(list)
+
+# sha256 -> list of occurrences already present in CANON
+already_by_sha: dict[str, list[dict]] = defaultdict(list)
+
+seen_paths: dict[str, str] = {}
+merged_files = 0
+skipped_already_in_canon = 0
+
+for pid in partial_ids:
+    path = resolve_manifest(os.path.join(PARTIALS_DIR, f"{pid}.occurrences.csv"))
+    if path is None:
+        raise SystemExit(f"ERROR: partial {pid!r} occurrence file not found in {PARTIALS_DIR}")
+
+    for row in iter_manifest(path, required=OCCURRENCE_REQUIRED_FIELDS):
+        rec = row._asdict()
+        if MERGE_REBASE_PATHS:
+            rec["takeoutRoot"] = os.path.join(TAKEOUT_ROOT, rec["account"], "unzipped")
+            rec["absPath"] = os.path.join(rec["takeoutRoot"], rec["relativePath"])
+
+        key = f"{rec['account']}/{rec['relativePath']}"
+        if key in seen_paths:
+            raise SystemExit(
+                f"ERROR: {key} appears in partials {seen_paths[key]!r} and {pid!r} (overlapping shards)"
+            )
+        seen_paths[key] = pid
+
+        sha = rec.pop("sha256").lower()
+        merged_files += 1
+        if sha in canon_hashes:
+            already_by_sha[sha].append(rec)
+            skipped_already_in_canon += 1
+        else:
+            records_by_sha[sha].append(rec)
+
+print(f"Run label: {RUN_LABEL}")
+print(f"Accounts: {', '.join(ACCOUNTS)} (preferred={PREFERRED_ACCOUNT})")
+print(f"Partial plans merged: {len(partial_ids):,}")
+for pid in partial_ids:
+    meta = metas[pid]
+    print(f"  {pid}: {meta['files']:,} files (host={meta.get('host', '?')}, shard={meta['shard']})")
+print(f"Existing canon hashes detected: {len(canon_hashes):,}")
+print(f"Merged takeout media files: {merged_files:,}")
+print(f"Takeout items already in CANON (skipped from plan): {skipped_already_in_canon:,}")
+print(f"New-to-CANON unique hashes found: {len(records_by_sha):,}")
+
+unique_rows, dup_rows, already_rows = plan_rows(records_by_sha, already_by_sha, PREFERRED_ACCOUNT, RUN_LABEL)
+unique_out, dup_out, already_out = write_plan(OUT_DIR, unique_rows, dup_rows, already_rows)
+
+print(f"Wrote: {unique_out} ({len(unique_rows):,} rows)")
+print(f"Wrote: {dup_out} ({len(dup_rows):,} rows)")
+print(f"Wrote: {already_out} ({len(already_rows):,} rows)")
+
+album_rows = membership_rows(records_by_sha, already_by_sha)
+print(f"Wrote: {write_album_membership(OUT_DIR, album_rows)} ({len(album_rows):,} rows)")
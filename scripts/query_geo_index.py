@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import sys
+
+from lib.env import require_env, optional_env
+from lib.geo_index import GeoIndex
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+GEO_INDEX_ROOT = optional_env("GEO_INDEX_ROOT", os.path.join(PHOTO_ARCHIVE, "MANIFESTS", "geo_index"))
+
+USAGE = (
+    "usage: query_geo_index.py bbox <lat_min> <lon_min> <lat_max> <lon_max>\n"
+    "       query_geo_index.py radius <lat> <lon> <km>"
+)
+
+args = sys.argv[1:]
+try:
+    mode, nums = args[0], [float(a) for a in args[1:]]
+except (IndexError, ValueError):
+    raise SystemExit(USAGE)
+if mode not in ("bbox", "radius") or len(nums) != (4 if mode == "bbox" else 3):
+    raise SystemExit(USAGE)
+
+index = GeoIndex(GEO_INDEX_ROOT)
+if not os.path.isfile(index.table_path):
+    raise SystemExit(f"ERROR: geo index not built yet: {GEO_INDEX_ROOT} (run build_view_by_place.py)")
+
+print("\t".join(["sha256", "ext", "latitude", "longitude", "geohash", "distanceKm"]))
+if mode == "bbox":
+    hits = [(None, row) for row in index.query_bbox(*nums)]
+else:
+    hits = index.query_radius(*nums)
+
+for dist, (gh, lat, lon, sha, ext) in hits:
+    print("\t".join([sha, ext, f"{lat:.7f}", f"{lon:.7f}", gh, "" if dist is None else f"{dist:.3f}"]))
+print(f"# {len(hits):,} matches", file=sys.stderr)
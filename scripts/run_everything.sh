@@ -114,6 +114,8 @@ for acct in $ACCOUNTS_STR; do
   if [[ ${#zips[@]} -eq 0 ]]; then
     log "WARNING: no ZIP files found in: $dest_zips"
   else
+    # Flat on purpose: Takeout ships media, its .json and album metadata.json in different ZIPs,
+    # and the sidecar, date and album lookups expect them side by side
     for z in "${zips[@]}"; do
       log "Unzip: $(basename "$z")"
       unzip -oq "$z" -d "$dest_unz"
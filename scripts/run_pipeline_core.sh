@@ -16,6 +16,11 @@ set -euo pipefail
 # Ensure python can import lib.env without relying on caller
 export PYTHONPATH="${PYTHONPATH:-$PHOTO_SCRIPTS}"
 
+# One CANON writer at a time: re-exec under PHOTO_ARCHIVE/LOCKS/canon.lock (shared with watch_zip_src.py)
+if [[ -z "${CANON_LOCK_HELD:-}" ]]; then
+  exec python3 "$PHOTO_SCRIPTS/scripts/with_canon_lock.py" bash "${BASH_SOURCE[0]}" "$@"
+fi
+
 check_canon_tripwire() {
   if find "$CANON" -type f -name '._*' -print -quit | grep -q .; then
     echo "ERROR: AppleDouble files (._*) present in CANON: $CANON" >&2
@@ -36,13 +41,24 @@ find "$CANON" -type f -name '.DS_Store' -delete || true
 check_canon_tripwire
 python3 "$PHOTO_SCRIPTS/scripts/check_canon_clean.py" | tee -a "$RUN_LOG"
 
-python3 "$PHOTO_SCRIPTS/scripts/build_run_plan.py"              | tee -a "$RUN_LOG"
-python3 "$PHOTO_SCRIPTS/scripts/materialize_canonicals.py"      | tee -a "$RUN_LOG"
-check_canon_tripwire
-python3 "$PHOTO_SCRIPTS/scripts/write_sidecars_from_takeout.py" | tee -a "$RUN_LOG"
+# batch     = plan, materialize and sidecars one after another (default)
+# streaming = one process that copies settled shas while hashing continues (same manifests)
+if [[ "${PIPELINE_MODE:-batch}" == "streaming" ]]; then
+  python3 "$PHOTO_SCRIPTS/scripts/run_streaming_pipeline.py"    | tee -a "$RUN_LOG"
+  python3 "$PHOTO_SCRIPTS/scripts/update_provenance_index.py"   | tee -a "$RUN_LOG"
+  check_canon_tripwire
+else
+  python3 "$PHOTO_SCRIPTS/scripts/build_run_plan.py"              | tee -a "$RUN_LOG"
+  python3 "$PHOTO_SCRIPTS/scripts/update_provenance_index.py"     | tee -a "$RUN_LOG"
+  python3 "$PHOTO_SCRIPTS/scripts/materialize_canonicals.py"      | tee -a "$RUN_LOG"
+  check_canon_tripwire
+  python3 "$PHOTO_SCRIPTS/scripts/write_sidecars_from_takeout.py" | tee -a "$RUN_LOG"
+fi
 python3 "$PHOTO_SCRIPTS/scripts/canonical_inventory.py"         | tee -a "$RUN_LOG"
 python3 "$PHOTO_SCRIPTS/scripts/build_view_by_date_exif.py"     | tee -a "$RUN_LOG"
 python3 "$PHOTO_SCRIPTS/scripts/build_view_by_date_takeout.py"  | tee -a "$RUN_LOG"
+python3 "$PHOTO_SCRIPTS/scripts/build_view_by_place.py"         | tee -a "$RUN_LOG"
+python3 "$PHOTO_SCRIPTS/scripts/build_view_by_album.py"         | tee -a "$RUN_LOG"
 
 # Tripwire at pipeline end
 check_canon_tripwire
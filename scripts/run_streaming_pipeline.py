@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# Streaming plan -> materialize -> sidecars, as one process.
+#
+# Files are hashed account by account in precedence order, so a sha is settled as
+# soon as no file still to be hashed could outrank its best occurrence; settled new
+# shas go straight to copy threads. Sidecars need every occurrence of a sha, so they
+# start once hashing is done and follow the remaining copies. Manifests come from the
+# same plan_rows()/write_plan() as build_run_plan.py and are byte-identical to it.
+from __future__ import annotations
+
+import heapq
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from lib.albums import membership_rows, write_album_membership
+from lib.env import require_env, optional_env, split_env
+from lib.fs_filters import remove_appledouble
+from lib.manifests import manifest_format
+from lib.provenance_index import ProvenanceIndex, rows_from_run_manifests
+from lib.read_schedule import READ_ORDER_POLICIES
+from lib.run_estimate import STAGE_COPY, STAGE_HASH, record_throughput
+from lib.run_plan import (
+    account_rank,
+    enumerate_media,
+    hash_occurrences,
+    load_canon_hashes,
+    plan_rows,
+    precedence_ordered_paths,
+    write_plan,
+)
+from lib.sidecar_store import SidecarPackWriter
+from lib.takeout_sidecar import (
+    ChunkPool,
+    merge_occurrence_history,
+    now_utc_iso,
+    publish_sidecar_results,
+    sidecar_chunk_failed,
+    write_sidecar_chunk,
+)
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+CANON = require_env("CANON")
+ACCOUNTS = split_env("ACCOUNTS_STR")  # REQUIRED (via env.py)
+PREFERRED_ACCOUNT = require_env("PREFERRED_ACCOUNT")
+RUN_LABEL = optional_env("RUN_LABEL", "run")
+TAKEOUT_BATCH_ID = optional_env("TAKEOUT_BATCH_ID", RUN_LABEL)
+INGEST_TOOL = optional_env("INGEST_TOOL", "dedupe-pipeline")
+
+TAKEOUT_ZIP_STEMS = split_env("TAKEOUT_ZIP_STEMS", default="")
+MANIFEST_FORMAT = manifest_format()
+
+HASH_READ_ORDER = optional_env("HASH_READ_ORDER", "extent").strip().lower()
+HASH_READAHEAD_FILES = int(optional_env("HASH_READAHEAD_FILES", "4"))
+HASH_DROP_CACHE = optional_env("HASH_DROP_CACHE", "1") == "1"
+
+# Same meaning as in write_sidecars_from_takeout.py
+SIDECAR_STORE = optional_env("SIDECAR_STORE", "files").strip().lower()
+SIDECAR_PACK_ROOT = optional_env(
+    "SIDECAR_PACK_ROOT", os.path.join(PHOTO_ARCHIVE, "CANONICAL", "sidecar-packs")
+)
+SIDECAR_HISTORY = optional_env("SIDECAR_HISTORY", "run").strip().lower()
+PROVENANCE_INDEX_ROOT = optional_env(
+    "PROVENANCE_INDEX_ROOT", os.path.join(PHOTO_ARCHIVE, "MANIFESTS", "provenance_index")
+)
+SIDECAR_WORKERS = int(optional_env("SIDECAR_WORKERS", str(os.cpu_count() or 1)))
+SIDECAR_CHUNK_SIZE = int(optional_env("SIDECAR_CHUNK_SIZE", "256"))
+
+# Bound on hashed-but-unplanned and settled-but-uncopied items, and parallel copies into CANON
+STREAM_QUEUE_SIZE = int(optional_env("STREAM_QUEUE_SIZE", "256"))
+STREAM_COPY_WORKERS = int(optional_env("STREAM_COPY_WORKERS", "1"))
+
+TAKEOUT_ROOT = os.path.join(PHOTO_ARCHIVE, "GOOGLE_TAKEOUT")
+OUT_DIR = os.path.join(PHOTO_ARCHIVE, "MANIFESTS", RUN_LABEL)
+
+# Only these columns are carried into sidecar construction
+OCC_FIELDS = ("sha256", "ext", "account", "relativePath", "absPath")
+
+if not ACCOUNTS:
+    raise SystemExit("ERROR: ACCOUNTS_STR resolved to zero accounts")
+
+if PREFERRED_ACCOUNT not in ACCOUNTS:
+    raise SystemExit(
+        "ERROR: PREFERRED_ACCOUNT must be one of ACCOUNTS_STR. "
+        f"PREFERRED_ACCOUNT={PREFERRED_ACCOUNT!r} ACCOUNTS_STR={ACCOUNTS!r}"
+    )
+
+if HASH_READ_ORDER not in READ_ORDER_POLICIES:
+    raise SystemExit(
+        f"ERROR: HASH_READ_ORDER must be one of {', '.join(READ_ORDER_POLICIES)} (got {HASH_READ_ORDER!r})"
+    )
+
+if SIDECAR_STORE not in ("files", "packed", "both"):
+    raise SystemExit(f"ERROR: SIDECAR_STORE must be files, packed or both (got {SIDECAR_STORE!r})")
+
+if SIDECAR_HISTORY not in ("run", "provenance"):
+    raise SystemExit(f"ERROR: SIDECAR_HISTORY must be run or provenance (got {SIDECAR_HISTORY!r})")
+
+
+def main() -> None:
+    started = time.monotonic()
+    imported_at = now_utc_iso()
+
+    canon_hashes = load_canon_hashes(CANON)
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+    candidates, missing_unzipped = enumerate_media(TAKEOUT_ROOT, ACCOUNTS, TAKEOUT_ZIP_STEMS)
+    if missing_unzipped:
+        msg = "ERROR: missing expected unzipped takeout directories:\n" + "\n".join(missing_unzipped)
+        raise SystemExit(msg)
+
+    ranks = account_rank(ACCOUNTS, PREFERRED_ACCOUNT)
+    paths = precedence_ordered_paths(candidates, ranks, HASH_READ_ORDER)
+
+    # Per account: heap of relativePaths not yet hashed (lazily pruned against `hashed_rel`)
+    unhashed: dict[str, list[str]] = defaultdict(list)
+    for p in paths:
+        acct, base, _ = candidates[p]
+        unhashed[acct].append(os.path.relpath(p, base))
+    for heap in unhashed.values():
+        heapq.heapify(heap)
+    hashed_rel: dict[str, set[str]] = defaultdict(set)
+
+    hashed_q: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    copy_q: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    copied_q: queue.Queue = queue.Queue()
+    stage_errors: list[BaseException] = []
+
+    def hash_stage() -> None:
+        try:
+            for item in hash_occurrences(
+                candidates, HASH_READ_ORDER, HASH_READAHEAD_FILES, HASH_DROP_CACHE, paths=paths
+            ):
+                hashed_q.put(item)
+        except BaseException as e:
+            stage_errors.append(e)
+        finally:
+            hashed_q.put(None)
+
+    def copy_stage() -> None:
+        while True:
+            item = copy_q.get()
+            if item is None:
+                return
+            sha, ext, src = item
+            dest = os.path.join(CANON, f"{sha}{ext}")
+            try:
+                if os.path.exists(dest):
+                    copied_q.put((sha, "present", None))
+                elif not os.path.isfile(src):
+                    print(f"WARNING: missing source, skipping: {src}")
+                    copied_q.put((sha, "missing", None))
+                else:
+                    # Avoid copying extended attributes/resource forks into ExFAT (AppleDouble).
+                    shutil.copyfile(src, dest)
+                    copied_q.put((sha, "copied", None))
+            except Exception as e:
+                copied_q.put((sha, "failed", f"{type(e).__name__}: {e}"))
+
+    hasher = threading.Thread(target=hash_stage, name="hash", daemon=True)
+    copiers = [
+        threading.Thread(target=copy_stage, name=f"copy-{i}", daemon=True)
+        for i in range(max(1, STREAM_COPY_WORKERS))
+    ]
+    hash_started = time.monotonic()
+    hasher.start()
+    for t in copiers:
+        t.start()
+
+    # ---- plan: settle shas as the precedence watermark passes them ------------------
+
+    records_by_sha: dict[str, list[dict]] = defaultdict(list)
+    already_by_sha: dict[str, list[dict]] = defaultdict(list)
+    best: dict[str, tuple[tuple[int, str], dict]] = {}
+    unsettled: list[tuple[tuple[int, str], str]] = []
+    settled: dict[str, str] = {}
+
+    scanned_media_files = 0
+    hashed_bytes = 0
+    skipped_already_in_canon = 0
+    settled_while_hashing = 0
+    first_copy_queued_at: Optional[float] = None
+
+    def settle(sha: str) -> None:
+        nonlocal first_copy_queued_at
+        occ = best[sha][1]
+        settled[sha] = occ["absPath"]
+        if first_copy_queued_at is None:
+            first_copy_queued_at = time.monotonic() - started
+        copy_q.put((sha, occ["ext"], occ["absPath"]))
+
+    while True:
+        item = hashed_q.get()
+        if item is None:
+            break
+        sha, rec = item
+        scanned_media_files += 1
+        hashed_bytes += os.path.getsize(rec["absPath"])
+
+        acct = rec["account"]
+        hashed_rel[acct].add(rec["relativePath"])
+
+        if sha in canon_hashes:
+            already_by_sha[sha].append(rec)
+            skipped_already_in_canon += 1
+        else:
+            records_by_sha[sha].append(rec)
+            key = (ranks[acct], rec["relativePath"])
+            if sha not in settled and (sha not in best or key < best[sha][0]):
+                best[sha] = (key, rec)
+                heapq.heappush(unsettled, (key, sha))
+
+        # Nothing still to be hashed can sort before this key
+        heap = unhashed[acct]
+        while heap and heap[0] in hashed_rel[acct]:
+            heapq.heappop(heap)
+        watermark = (ranks[acct], heap[0]) if heap else (ranks[acct] + 1, "")
+
+        while unsettled and unsettled[0][0] < watermark:
+            key, s = heapq.heappop(unsettled)
+            if s in settled or best[s][0] != key:
+                continue
+            settle(s)
+            settled_while_hashing += 1
+
+    hasher.join()
+    hash_error = stage_errors[0] if stage_errors else None
+    hash_done_at = time.monotonic() - started
+    # Same measurements as build_run_plan.py / materialize_canonicals.py, for the dry-run estimate
+    record_throughput(
+        PHOTO_ARCHIVE, STAGE_HASH, RUN_LABEL, scanned_media_files, hashed_bytes, time.monotonic() - hash_started
+    )
+
+    if hash_error is None:
+        while unsettled:
+            key, s = heapq.heappop(unsettled)
+            if s not in settled and best[s][0] == key:
+                settle(s)
+    else:
+        # Settled shas are already (being) copied: finish planning and sidecars for exactly those,
+        # so nothing lands in CANON without manifest rows; the rest is left for a rerun.
+        records_by_sha = defaultdict(list, {s: records_by_sha[s] for s in settled})
+    for _ in copiers:
+        copy_q.put(None)
+
+    unique_rows, dup_rows, already_rows = plan_rows(records_by_sha, already_by_sha, PREFERRED_ACCOUNT, RUN_LABEL)
+    for row in unique_rows:
+        if settled.get(row["sha256"]) != row["absPath"]:
+            raise SystemExit(f"ERROR: streaming precedence disagrees with the plan for {row['sha256']}")
+    unique_out, dup_out, already_out = write_plan(OUT_DIR, unique_rows, dup_rows, already_rows)
+    album_rows = membership_rows(records_by_sha, already_by_sha)
+    album_out = write_album_membership(OUT_DIR, album_rows)
+
+    print(f"Run label: {RUN_LABEL}")
+    print(f"Accounts: {', '.join(ACCOUNTS)} (preferred={PREFERRED_ACCOUNT})")
+    if TAKEOUT_ZIP_STEMS:
+        print(f"Scoped to ZIP folders: {', '.join(TAKEOUT_ZIP_STEMS)}")
+    print(f"Existing canon hashes detected: {len(canon_hashes):,}")
+    print(f"Scanned takeout media files: {scanned_media_files:,}")
+    print(f"Takeout items already in CANON (skipped from plan): {skipped_already_in_canon:,}")
+    print(f"New-to-CANON unique hashes found: {len(records_by_sha):,}")
+    print(f"Wrote: {unique_out} ({len(unique_rows):,} rows)")
+    print(f"Wrote: {dup_out} ({len(dup_rows):,} rows)")
+    print(f"Wrote: {already_out} ({len(already_rows):,} rows)")
+    print(f"Wrote: {album_out} ({len(album_rows):,} rows)")
+
+    # ---- sidecars: every occurrence is known now; follow the copies as they land -----
+
+    occurrences: dict[str, list[dict]] = defaultdict(list)
+    unique_by_sha: dict[str, dict] = {}
+    for row in unique_rows:
+        occ = {k: row[k] for k in OCC_FIELDS}
+        unique_by_sha[row["sha256"]] = occ
+        occurrences[row["sha256"]].append(occ)
+    for row in dup_rows:
+        occurrences[row["sha256"]].append({k: row[k] for k in OCC_FIELDS})
+
+    provenance = None
+    if SIDECAR_HISTORY == "provenance":
+        # Same index state the batch pipeline has after update_provenance_index.py
+        provenance = ProvenanceIndex(PROVENANCE_INDEX_ROOT)
+        provenance.append_run(RUN_LABEL, rows_from_run_manifests(unique_rows, dup_rows, already_rows))
+
+    write_files = SIDECAR_STORE != "packed"
+    pack_writer = SidecarPackWriter(SIDECAR_PACK_ROOT, RUN_LABEL) if SIDECAR_STORE != "files" else None
+    chunk_args = (CANON, PHOTO_ARCHIVE, TAKEOUT_BATCH_ID, INGEST_TOOL, imported_at, write_files, pack_writer is not None)
+
+    workers = max(1, min(SIDECAR_WORKERS, len(unique_rows)))
+    sidecar_pool = ChunkPool(write_sidecar_chunk, chunk_args, workers, sidecar_chunk_failed)
+
+    copied = 0
+    copied_bytes = 0
+    present = 0
+    missing_src = 0
+    copy_failures: list[tuple[str, str]] = []
+    chunk: list = []
+    for _ in range(len(settled)):
+        sha, status, error = copied_q.get()
+        if status == "copied":
+            copied += 1
+            copied_bytes += os.path.getsize(os.path.join(CANON, f"{sha}{unique_by_sha[sha]['ext']}"))
+        elif status == "present":
+            present += 1
+        elif status == "missing":
+            missing_src += 1
+            continue
+        else:
+            copy_failures.append((sha, error or status))
+            continue
+
+        uniq = unique_by_sha[sha]
+        run_occs = occurrences[sha]
+        occs = merge_occurrence_history(provenance.lookup(sha), run_occs) if provenance is not None else run_occs
+        chunk.append((sha, uniq["ext"], uniq, occs))
+        if len(chunk) >= SIDECAR_CHUNK_SIZE:
+            sidecar_pool.submit(chunk)
+            chunk = []
+    if chunk:
+        sidecar_pool.submit(chunk)
+    materialized_at = time.monotonic() - started
+    # Copies overlap hashing, so the copy stage is timed from the first queued copy
+    record_throughput(
+        PHOTO_ARCHIVE, STAGE_COPY, RUN_LABEL, copied, copied_bytes, materialized_at - (first_copy_queued_at or 0.0)
+    )
+
+    for t in copiers:
+        t.join()
+    if provenance is not None:
+        provenance.close()
+
+    results = sidecar_pool.results()
+
+    # Same cleanup as materialize_canonicals.py, before the pipeline's CANON tripwire runs
+    removed = remove_appledouble(CANON)
+    if removed:
+        print(f"WARNING: removed AppleDouble files from CANON: {removed}")
+
+    failures: list[tuple[str, str]] = list(copy_failures)
+    written, missing_json, pack_dir = publish_sidecar_results(results, pack_writer, failures)
+    elapsed = time.monotonic() - started
+
+    print(f"Copied new canonicals: {copied:,}")
+    print(f"Skipped (already present): {present:,}")
+    print(f"Missing sources: {missing_src:,}")
+    print(f"Sidecars written: {written:,} (store={SIDECAR_STORE}, history={SIDECAR_HISTORY}, workers={workers})")
+    if pack_writer is not None:
+        print(f"Sidecar pack: {pack_dir or 'not written (failures below)'}")
+    print(f"Canonicals with no metadata JSON found: {missing_json:,}")
+    print(
+        f"Stream: {settled_while_hashing:,} of {len(settled):,} new canonicals settled before hashing finished; "
+        f"first copy queued {first_copy_queued_at or 0:,.1f}s, hashing done {hash_done_at:,.1f}s, "
+        f"copies done {materialized_at:,.1f}s, total {elapsed:,.1f}s"
+    )
+
+    if failures:
+        print(f"ERROR: streaming pipeline failed for {len(failures):,} canonicals:")
+        for sha, error in failures[:10]:
+            print(f" - {sha}: {error}")
+        if len(failures) > 10:
+            print(" - ...")
+        if hash_error is None:
+            raise SystemExit(1)
+
+    if hash_error is not None:
+        raise SystemExit(
+            f"ERROR: hashing failed: {type(hash_error).__name__}: {hash_error}\n"
+            f"Manifests and sidecars cover only the {len(settled):,} canonicals settled before the failure; "
+            "rerun the pipeline to pick up the rest."
+        )
+
+
+if __name__ == "__main__":
+    main()
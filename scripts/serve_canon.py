@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import time
+
+from lib.canon_server import MAX_HEADER_BYTES, CanonIndex, CanonServer
+from lib.env import require_env, optional_env
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+CANON = require_env("CANON")
+
+SIDECAR_PACK_ROOT = optional_env(
+    "SIDECAR_PACK_ROOT", os.path.join(PHOTO_ARCHIVE, "CANONICAL", "sidecar-packs")
+)
+
+# Localhost only by default: there is no authentication
+SERVE_HOST = optional_env("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(optional_env("SERVE_PORT", "8765"))
+
+if not os.path.isdir(CANON):
+    raise SystemExit(f"ERROR: CANON directory does not exist: {CANON}")
+
+
+def load_index(index: CanonIndex) -> None:
+    t0 = time.perf_counter()
+    index.load()
+    packed = len(index.packed) if index.packed is not None else 0
+    print(
+        f"Indexed canonicals: {len(index.media):,} "
+        f"(sidecar files {len(index.sidecar_files):,}, packed sidecars {packed:,}) "
+        f"in {time.perf_counter() - t0:.2f}s",
+        flush=True,
+    )
+
+
+async def main() -> None:
+    index = CanonIndex(CANON, SIDECAR_PACK_ROOT)
+    load_index(index)
+    app = CanonServer(index)
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    # New runs add canonicals; SIGHUP re-lists CANON and the packs without dropping connections
+    loop.add_signal_handler(signal.SIGHUP, load_index, index)
+
+    server = await asyncio.start_server(app.handle, SERVE_HOST, SERVE_PORT, limit=MAX_HEADER_BYTES)
+    for sock in server.sockets:
+        host, port = sock.getsockname()[:2]
+        print(f"Serving {CANON} on http://{host}:{port}/ (SIGHUP reloads the index)", flush=True)
+
+    async with server:
+        await stop.wait()
+
+    print(f"Requests: {app.requests:,}")
+    print(f"Bytes sent: {app.bytes_sent:,}")
+    print("Done.")
+
+
+asyncio.run(main())
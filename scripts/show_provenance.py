@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import sys
+
+from lib.env import require_env, optional_env
+from lib.provenance_index import FIELDS, ProvenanceIndex
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+PROVENANCE_INDEX_ROOT = optional_env(
+    "PROVENANCE_INDEX_ROOT", os.path.join(PHOTO_ARCHIVE, "MANIFESTS", "provenance_index")
+)
+
+shas = [a.strip().lower() for a in sys.argv[1:] if a.strip()]
+if not shas:
+    raise SystemExit("usage: show_provenance.py <sha256> [<sha256> ...]")
+
+index = ProvenanceIndex(PROVENANCE_INDEX_ROOT)
+print("\t".join(FIELDS))
+for sha in shas:
+    rows = index.lookup(sha)
+    if not rows:
+        print(f"# {sha}: no occurrences recorded", file=sys.stderr)
+    for row in rows:
+        print("\t".join(row.get(k, "") for k in FIELDS))
+index.close()
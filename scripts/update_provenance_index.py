@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+
+from lib.env import require_env, optional_env
+from lib.manifests import read_manifest_dicts, resolve_manifest
+from lib.provenance_index import ProvenanceIndex, rows_from_run_manifests
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+RUN_LABEL = optional_env("RUN_LABEL", "run")
+
+MANIFESTS_ROOT = os.path.join(PHOTO_ARCHIVE, "MANIFESTS")
+PROVENANCE_INDEX_ROOT = optional_env(
+    "PROVENANCE_INDEX_ROOT", os.path.join(MANIFESTS_ROOT, "provenance_index")
+)
+
+# Compact once this many runs are pending (or always, with PROVENANCE_COMPACT=1)
+PROVENANCE_COMPACT_EVERY = int(optional_env("PROVENANCE_COMPACT_EVERY", "8"))
+PROVENANCE_COMPACT = optional_env("PROVENANCE_COMPACT", "0") == "1"
+# Append every run found under MANIFESTS/, not just RUN_LABEL (one-time migration)
+PROVENANCE_BACKFILL = optional_env("PROVENANCE_BACKFILL", "0") == "1"
+
+
+def read_rows(csv_path: str) -> list[dict]:
+    path = resolve_manifest(csv_path)
+    if path is None:
+        return []
+    return list(read_manifest_dicts(path))
+
+
+def run_has_plan(run_label: str) -> bool:
+    return resolve_manifest(os.path.join(MANIFESTS_ROOT, run_label, "dedup_plan__unique.csv")) is not None
+
+
+if PROVENANCE_BACKFILL:
+    runs = sorted(
+        name for name in os.listdir(MANIFESTS_ROOT)
+        if os.path.isdir(os.path.join(MANIFESTS_ROOT, name)) and run_has_plan(name)
+    )
+else:
+    if not run_has_plan(RUN_LABEL):
+        raise SystemExit(
+            "ERROR: expected manifest not found: "
+            + os.path.join(MANIFESTS_ROOT, RUN_LABEL, "dedup_plan__unique.csv")
+        )
+    runs = [RUN_LABEL]
+
+index = ProvenanceIndex(PROVENANCE_INDEX_ROOT)
+
+appended_rows = 0
+for run in runs:
+    run_dir = os.path.join(MANIFESTS_ROOT, run)
+    rows = rows_from_run_manifests(
+        read_rows(os.path.join(run_dir, "dedup_plan__unique.csv")),
+        read_rows(os.path.join(run_dir, "dedup_plan__duplicates.csv")),
+        read_rows(os.path.join(run_dir, "already_in_canon.csv")),
+    )
+    n = index.append_run(run, rows)
+    appended_rows += n
+    print(f"Appended run {run}: {n:,} occurrence rows")
+
+pending = index.pending_runs()
+compacted_rows = None
+if PROVENANCE_COMPACT or len(pending) >= PROVENANCE_COMPACT_EVERY:
+    compacted_rows = index.compact()
+
+print(f"Provenance index: {PROVENANCE_INDEX_ROOT}")
+print(f"Runs appended: {len(runs):,} ({appended_rows:,} rows)")
+if compacted_rows is not None:
+    print(f"Compacted {len(pending):,} pending runs -> {compacted_rows:,} rows total")
+else:
+    print(f"Pending (uncompacted) runs: {len(pending):,} (compacts at {PROVENANCE_COMPACT_EVERY})")
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from datetime import datetime, timezone
+
+from lib.canon_lock import canon_lock
+from lib.env import require_env, optional_env, split_env
+from lib.fs_filters import should_skip_filename
+from lib.run_estimate import STAGE_UNZIP, record_throughput
+from lib.zip_watch import DirWatcher
+
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+CANON = require_env("CANON")
+ACCOUNTS = split_env("ACCOUNTS_STR")  # REQUIRED (via env.py)
+
+# A ZIP is picked up once its mtime is this old (downloads keep touching the file until done)
+WATCH_SETTLE_SECONDS = float(optional_env("WATCH_SETTLE_SECONDS", "60"))
+# Rescan interval; with inotify this is only a safety net
+WATCH_POLL_SECONDS = float(optional_env("WATCH_POLL_SECONDS", "30"))
+WATCH_BACKEND = optional_env("WATCH_BACKEND", "auto").strip().lower()
+# Process whatever is ready right now, then exit (cron / testing)
+WATCH_ONCE = optional_env("WATCH_ONCE", "0") == "1"
+# Optional: move each processed ZIP out of ZIP_SRC into <dir>/<account>/
+WATCH_PROCESSED_DIR = optional_env("WATCH_PROCESSED_DIR", "")
+# Move every failed/ job back to pending/ at startup
+WATCH_RETRY_FAILED = optional_env("WATCH_RETRY_FAILED", "0") == "1"
+
+INGEST_TOOL = optional_env("INGEST_TOOL", "dedupe-pipeline")
+
+PHOTO_SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAKEOUT_ROOT = os.path.join(PHOTO_ARCHIVE, "GOOGLE_TAKEOUT")
+LOG_DIR = os.path.join(PHOTO_ARCHIVE, "LOGS")
+QUEUE_ROOT = os.path.join(PHOTO_ARCHIVE, "QUEUE", "zip-ingest")
+QUEUE_STATES = ("pending", "running", "done", "failed")
+
+# Per-ZIP pipeline: same stages as run_pipeline_core.sh, minus whole-archive views/inventory
+JOB_STAGES = [
+    "check_canon_clean.py",
+    "build_run_plan.py",
+    "update_provenance_index.py",
+    "materialize_canonicals.py",
+    "check_canon_clean.py",
+    "write_sidecars_from_takeout.py",
+]
+
+SAFE_RX = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def zip_src_dir(acct: str) -> str:
+    v = os.environ.get(f"ZIP_SRC_{acct}", "").strip()
+    if not v:
+        raise SystemExit(f"ERROR: env var ZIP_SRC_{acct} is required")
+    if not os.path.isdir(v):
+        raise SystemExit(f"ERROR: ZIP_SRC_{acct} points to missing dir: {v}")
+    return v
+
+
+def job_id(acct: str, stem: str) -> str:
+    return SAFE_RX.sub("_", f"{acct}__{stem}")
+
+
+def queue_path(state: str, jid: str) -> str:
+    return os.path.join(QUEUE_ROOT, state, f"{jid}.json")
+
+
+def job_state(jid: str) -> str | None:
+    for state in QUEUE_STATES:
+        if os.path.isfile(queue_path(state, jid)):
+            return state
+    return None
+
+
+def write_job(state: str, job: dict) -> None:
+    path = queue_path(state, job["id"])
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def move_job(job: dict, src_state: str, dst_state: str) -> None:
+    write_job(dst_state, job)
+    try:
+        os.remove(queue_path(src_state, job["id"]))
+    except FileNotFoundError:
+        pass
+
+
+def log(msg: str) -> None:
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+
+def requeue(state: str) -> int:
+    """Move every job in `state` back to pending/, dropping its recorded error."""
+    n = 0
+    state_dir = os.path.join(QUEUE_ROOT, state)
+    for fn in sorted(os.listdir(state_dir)):
+        if not fn.endswith(".json"):
+            continue
+        with open(os.path.join(state_dir, fn), "r", encoding="utf-8") as f:
+            job = json.load(f)
+        job.pop("error", None)
+        move_job(job, state, "pending")
+        n += 1
+    return n
+
+
+def scan_and_enqueue(src_dirs: dict[str, str]) -> int:
+    """Enqueue every ZIP that has finished downloading and has no job yet."""
+    now = time.time()
+    enqueued = 0
+    for acct, src in src_dirs.items():
+        for fn in sorted(os.listdir(src)):
+            if should_skip_filename(fn) or not fn.lower().endswith(".zip"):
+                continue
+            path = os.path.join(src, fn)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - st.st_mtime < WATCH_SETTLE_SECONDS:
+                continue
+
+            stem = os.path.splitext(fn)[0]
+            jid = job_id(acct, stem)
+            if job_state(jid) is not None:
+                continue
+            # Size/mtime settled but the central directory isn't there yet: still being written.
+            if not zipfile.is_zipfile(path):
+                continue
+
+            write_job(
+                "pending",
+                {
+                    "id": jid,
+                    "account": acct,
+                    "zipPath": path,
+                    "zipStem": stem,
+                    "bytes": st.st_size,
+                    "enqueuedAt": datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+                },
+            )
+            log(f"Enqueued {jid} ({st.st_size:,} bytes)")
+            enqueued += 1
+    return enqueued
+
+
+def next_pending() -> dict | None:
+    pending_dir = os.path.join(QUEUE_ROOT, "pending")
+    jobs = []
+    for fn in os.listdir(pending_dir):
+        if not fn.endswith(".json"):
+            continue
+        with open(os.path.join(pending_dir, fn), "r", encoding="utf-8") as f:
+            jobs.append(json.load(f))
+    if not jobs:
+        return None
+    return min(jobs, key=lambda j: (j["enqueuedAt"], j["id"]))
+
+
+def stage_zip(job: dict) -> None:
+    acct = job["account"]
+    stem = job["zipStem"]
+    zips_dir = os.path.join(TAKEOUT_ROOT, acct, "zips")
+    unzipped_dir = os.path.join(TAKEOUT_ROOT, acct, "unzipped")
+    os.makedirs(zips_dir, exist_ok=True)
+    os.makedirs(unzipped_dir, exist_ok=True)
+
+    dest_zip = os.path.join(zips_dir, os.path.basename(job["zipPath"]))
+    if not (os.path.isfile(dest_zip) and os.path.getsize(dest_zip) == job["bytes"]):
+        tmp = dest_zip + ".partial"
+        shutil.copyfile(job["zipPath"], tmp)
+        os.replace(tmp, dest_zip)
+
+    dest_unz = os.path.join(unzipped_dir, stem)
+    if os.path.isdir(dest_unz):
+        return
+    partial = os.path.join(unzipped_dir, f".{stem}.partial")
+    shutil.rmtree(partial, ignore_errors=True)
+    started = time.monotonic()
+    files = 0
+    nbytes = 0
+    with zipfile.ZipFile(dest_zip) as zf:
+        for member in zf.infolist():
+            name = member.filename
+            if name.startswith("__MACOSX/") or should_skip_filename(os.path.basename(name.rstrip("/"))):
+                continue
+            zf.extract(member, partial)
+            if not member.is_dir():
+                files += 1
+                nbytes += member.file_size
+    os.rename(partial, dest_unz)
+    record_throughput(PHOTO_ARCHIVE, STAGE_UNZIP, job["runLabel"], files, nbytes, time.monotonic() - started)
+
+
+def run_job(job: dict) -> None:
+    run_label = SAFE_RX.sub("_", f"{datetime.now().strftime('%Y-%m-%d_%H_%M_%S')}__zip__{job['account']}__{job['zipStem']}")
+    job["runLabel"] = run_label
+    run_log = os.path.join(LOG_DIR, f"{run_label}.log")
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    # Scoped to this one ZIP, so precedence across accounts is first-come and JSON shipped in
+    # another ZIP is not seen (README lists both limits)
+    env = dict(os.environ)
+    env.update(
+        {
+            "PHOTO_SCRIPTS": PHOTO_SCRIPTS,
+            "PYTHONPATH": PHOTO_SCRIPTS,
+            "RUN_LABEL": run_label,
+            "RUN_LOG": run_log,
+            "ACCOUNTS_STR": job["account"],
+            "PREFERRED_ACCOUNT": job["account"],
+            "TAKEOUT_ZIP_STEMS": job["zipStem"],
+            "TAKEOUT_BATCH_ID": run_label,
+            "INGEST_TOOL": INGEST_TOOL,
+        }
+    )
+
+    with canon_lock(PHOTO_ARCHIVE), open(run_log, "a", encoding="utf-8") as lf:
+        lf.write(f"Job {job['id']}: {job['zipPath']}\n")
+        lf.flush()
+        stage_zip(job)
+        for script in JOB_STAGES:
+            lf.write(f"--- {script}\n")
+            lf.flush()
+            # Own session: a Ctrl-C aimed at the watcher must not kill (and fail) the running stage
+            p = subprocess.run(
+                [sys.executable, os.path.join(PHOTO_SCRIPTS, "scripts", script)],
+                env=env,
+                stdout=lf,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+            if p.returncode != 0:
+                raise RuntimeError(f"{script} exited with {p.returncode} (see {run_log})")
+
+    if WATCH_PROCESSED_DIR:
+        dest_dir = os.path.join(WATCH_PROCESSED_DIR, job["account"])
+        os.makedirs(dest_dir, exist_ok=True)
+        shutil.move(job["zipPath"], os.path.join(dest_dir, os.path.basename(job["zipPath"])))
+
+
+def drain_queue(stop: threading.Event | None = None) -> tuple[int, int]:
+    ok = 0
+    failed = 0
+    while stop is None or not stop.is_set():
+        job = next_pending()
+        if job is None:
+            break
+        move_job(job, "pending", "running")
+        started = time.monotonic()
+        log(f"Running {job['id']}")
+        try:
+            run_job(job)
+        except Exception as e:
+            job["error"] = f"{type(e).__name__}: {e}"
+            move_job(job, "running", "failed")
+            log(f"FAILED {job['id']}: {job['error']}")
+            failed += 1
+            continue
+        job["seconds"] = round(time.monotonic() - started, 1)
+        move_job(job, "running", "done")
+        log(f"Done {job['id']} as {job['runLabel']} ({job['seconds']:,}s)")
+        ok += 1
+    return ok, failed
+
+
+def main() -> None:
+    src_dirs = {acct: zip_src_dir(acct) for acct in ACCOUNTS}
+    for state in QUEUE_STATES:
+        os.makedirs(os.path.join(QUEUE_ROOT, state), exist_ok=True)
+
+    # Jobs left "running" by a previous (crashed) watcher are retried from scratch.
+    requeue("running")
+    if WATCH_RETRY_FAILED:
+        log(f"Requeued failed jobs: {requeue('failed'):,}")
+
+    if WATCH_ONCE:
+        scan_and_enqueue(src_dirs)
+        ok, failed = drain_queue()
+        print(f"Jobs completed: {ok:,}")
+        print(f"Jobs failed: {failed:,}")
+        if failed:
+            raise SystemExit(1)
+        return
+
+    watcher = DirWatcher(list(src_dirs.values()), backend=WATCH_BACKEND)
+    log(f"Watching {len(src_dirs)} ZIP_SRC dirs ({watcher.backend}); settle={WATCH_SETTLE_SECONDS:g}s")
+
+    # One consumer thread drains the queue so scanning continues while a job runs.
+    wake = threading.Event()
+    stop = threading.Event()
+
+    def consumer() -> None:
+        while not stop.is_set():
+            drain_queue(stop)
+            wake.wait(WATCH_POLL_SECONDS)
+            wake.clear()
+
+    t = threading.Thread(target=consumer, name="zip-ingest", daemon=True)
+    t.start()
+    try:
+        while True:
+            if scan_and_enqueue(src_dirs):
+                wake.set()
+            # A change may be a download still in progress, so rescan at least once per settle window.
+            watcher.wait(min(WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS))
+    except KeyboardInterrupt:
+        log("Stopping (current job, if any, finishes first)")
+        stop.set()
+        wake.set()
+        t.join()
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import sys
+
+from lib.canon_lock import canon_lock, canon_lock_path
+from lib.env import require_env, optional_env
+
+# Runs one command while holding PHOTO_ARCHIVE/LOCKS/canon.lock, the lock watch_zip_src.py
+# takes per job. run_pipeline_core.sh re-execs itself through this.
+PHOTO_ARCHIVE = require_env("PHOTO_ARCHIVE")
+
+# Give up after this many seconds (default: wait for the running job to finish)
+CANON_LOCK_TIMEOUT = optional_env("CANON_LOCK_TIMEOUT", "")
+
+if len(sys.argv) < 2:
+    raise SystemExit("usage: with_canon_lock.py <command> [args...]")
+
+timeout = float(CANON_LOCK_TIMEOUT) if CANON_LOCK_TIMEOUT else None
+
+print(f"Acquiring CANON lock: {canon_lock_path(PHOTO_ARCHIVE)}", flush=True)
+with canon_lock(PHOTO_ARCHIVE, timeout=timeout):
+    # Ctrl-C reaches the command through the process group; wait for it to exit rather than
+    # dropping the lock under it. (A handler, unlike SIG_IGN, is not inherited across exec.)
+    signal.signal(signal.SIGINT, lambda signum, frame: None)
+    p = subprocess.run(sys.argv[1:], env={**os.environ, "CANON_LOCK_HELD": "1"})
+
+sys.exit(p.returncode if p.returncode >= 0 else 128 - p.returncode)